@@ -1,11 +1,32 @@
 from django.contrib import admin
 from catalog.models import Product, Category, Version, Blog
+from catalog.services import set_published
+
+
+@admin.action(description="Опубликовать выбранные")
+def publish(modeladmin, request, queryset):
+    updated = set_published(queryset, True)
+    modeladmin.message_user(request, f"Опубликовано: {updated}")
+
+
+@admin.action(description="Снять с публикации выбранные")
+def unpublish(modeladmin, request, queryset):
+    updated = set_published(queryset, False)
+    modeladmin.message_user(request, f"Снято с публикации: {updated}")
+
 
 @admin.register(Product)
 class ProductsAdmin(admin.ModelAdmin):
-    list_display = ('id', 'name', 'price', 'category')
-    list_filter = ('category',)
+    list_display = ('id', 'name', 'price', 'category', 'is_published')
+    list_filter = ('category', 'is_published')
     search_fields = ('name',)
+    actions = (publish, unpublish)
+
+    def get_search_results(self, request, queryset, search_term):
+        # Ищем по полнотекстовому индексу вместо icontains по названию
+        if not search_term:
+            return queryset, False
+        return queryset.search(search_term), False
 
 @admin.register(Category)
 class CategoryAdmin(admin.ModelAdmin):
@@ -16,3 +37,10 @@ class CategoryAdmin(admin.ModelAdmin):
 class VersionAdmin(admin.ModelAdmin):
     list_display = ('id', 'product')
 
+
+@admin.register(Blog)
+class BlogAdmin(admin.ModelAdmin):
+    list_display = ('id', 'title', 'is_published', 'views_count')
+    list_filter = ('is_published',)
+    search_fields = ('title',)
+    actions = (publish, unpublish)
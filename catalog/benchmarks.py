@@ -0,0 +1,542 @@
+import http.client
+import random
+import re
+import socket
+import statistics
+import threading
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Callable, NamedTuple
+from urllib.parse import urlencode
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import Permission
+from django.core.servers.basehttp import (
+    ThreadedWSGIServer,
+    WSGIRequestHandler,
+    WSGIServer,
+)
+from django.db import connection, transaction
+from django.test import Client
+from django.urls import reverse
+from django.utils.crypto import get_random_string
+
+from catalog.models import Blog, Category, Product, Version
+from catalog.services import (
+    invalidate_categories_cache,
+    refresh_category_stats,
+    set_published,
+)
+from users.models import User
+
+# Префикс синтетических данных, по нему они удаляются перед новым заполнением
+BENCH_PREFIX = "bench"
+BENCH_PASSWORD = "benchmark"
+# Права владельцев товаров для замеров выгрузки и массовой публикации
+BENCH_PERMISSIONS = ("view_product", "can_cancel_publication")
+
+WORDS = (
+    "смартфон", "ноутбук", "планшет", "наушники", "камера", "часы", "колонка",
+    "монитор", "клавиатура", "мышь", "роутер", "принтер", "зарядка", "чехол",
+    "быстрый", "легкий", "тихий", "яркий", "надежный", "компактный", "новый",
+)
+
+# Выполненные SQL-запросы из заголовка Server-Timing (PerformanceMiddleware)
+QUERIES_RE = re.compile(r'db;[^,]*desc="(\d+) queries"')
+
+
+def _text(rng, words):
+    return " ".join(rng.choice(WORDS) for _ in range(words))
+
+
+def clear_benchmark_data():
+    """
+    Удаляет синтетические данные прошлого заполнения. Категории удаляются
+    первыми: товары без категории не пересчитывают статистику категорий
+    при удалении
+    """
+    Category.objects.filter(name__startswith=BENCH_PREFIX).delete()
+    Product.objects.filter(name__startswith=BENCH_PREFIX).delete()
+    Blog.objects.filter(title__startswith=BENCH_PREFIX).delete()
+    User.objects.filter(email__startswith=f"{BENCH_PREFIX}-").delete()
+
+
+def seed_benchmark_data(
+    categories, products, versions, blogs, users, batch_size=1000, seed=0
+):
+    """
+    Заполняет БД синтетическим каталогом. Одинаковый seed дает
+    одинаковые данные, поэтому результаты разных коммитов сравнимы
+    """
+    rng = random.Random(seed)
+    password = make_password(BENCH_PASSWORD)
+    with transaction.atomic():
+        owners = User.objects.bulk_create(
+            (
+                User(email=f"{BENCH_PREFIX}-{i}@example.com", password=password)
+                for i in range(users)
+            ),
+            batch_size=batch_size,
+        )
+        permissions = list(
+            Permission.objects.filter(
+                content_type__app_label="catalog", codename__in=BENCH_PERMISSIONS
+            )
+        )
+        UserPermission = User.user_permissions.through
+        UserPermission.objects.bulk_create(
+            (
+                UserPermission(user_id=owner.pk, permission_id=permission.pk)
+                for owner in owners
+                for permission in permissions
+            ),
+            batch_size=batch_size,
+        )
+        category_list = Category.objects.bulk_create(
+            (
+                Category(
+                    name=f"{BENCH_PREFIX} {_text(rng, 2)} {i}",
+                    description=_text(rng, 20),
+                )
+                for i in range(categories)
+            ),
+            batch_size=batch_size,
+        )
+        product_list = Product.objects.bulk_create(
+            (
+                Product(
+                    name=f"{BENCH_PREFIX} {_text(rng, 3)} {i}",
+                    description=_text(rng, 60),
+                    category=rng.choice(category_list),
+                    owner=rng.choice(owners) if owners else None,
+                    price=rng.randint(100, 200000),
+                    is_published=rng.random() < 0.9,
+                )
+                for i in range(products)
+            ),
+            batch_size=batch_size,
+        )
+        Version.objects.bulk_create(
+            (
+                Version(
+                    product=product,
+                    version_number=str(number + 1),
+                    version_name=_text(rng, 2),
+                    is_version_active=number == versions - 1,
+                )
+                for product in product_list
+                for number in range(versions)
+            ),
+            batch_size=batch_size,
+        )
+        Product.objects.filter(name__startswith=BENCH_PREFIX).refresh_active_versions()
+        refresh_category_stats([category.pk for category in category_list])
+        Blog.objects.bulk_create(
+            (
+                Blog(
+                    title=f"{BENCH_PREFIX} {_text(rng, 4)} {i}",
+                    description=_text(rng, 300),
+                    is_published=rng.random() < 0.9,
+                )
+                for i in range(blogs)
+            ),
+            batch_size=batch_size,
+        )
+        transaction.on_commit(invalidate_categories_cache)
+
+
+class Route(NamedTuple):
+    """
+    Маршрут для замеров. У маршрутов, изменяющих данные, reset
+    возвращает данные в исходное состояние после каждого запроса,
+    поэтому все замеры выполняются на одних и тех же данных; время
+    reset в замер не входит
+    """
+
+    name: str
+    method: str
+    url: str
+    login: bool
+    data: dict | None = None
+    reset: Callable[[], object] | None = None
+
+
+def get_routes():
+    """
+    Маршруты catalog.urls и users.urls с параметрами для замеров.
+    Возвращает владельца товара, под которым выполняется вход, и список
+    Route. Выгрузка обслуживается export_catalog или, при ASYNC_VIEWS,
+    aexport_catalog
+    """
+    product = (
+        Product.objects.filter(
+            name__startswith=BENCH_PREFIX, owner__isnull=False, is_published=True
+        )
+        .order_by("pk")
+        .first()
+    )
+    blog = Blog.objects.filter(title__startswith=BENCH_PREFIX).order_by("pk").first()
+    if product is None or blog is None:
+        return None, []
+
+    def reset_blog():
+        Blog.objects.filter(pk=blog.pk).update(is_published=blog.is_published)
+
+    def reset_product():
+        set_published(Product.objects.filter(pk=product.pk), True)
+
+    return product.owner, [
+        Route("catalog:product_list", "GET", reverse("catalog:product_list"), False),
+        Route(
+            "catalog:product_search",
+            "GET",
+            f"{reverse('catalog:product_search')}?{urlencode({'q': WORDS[0]})}",
+            False,
+        ),
+        Route("catalog:contacts", "GET", reverse("catalog:contacts"), False),
+        Route(
+            "catalog:product_detail",
+            "GET",
+            reverse("catalog:product_detail", args=[product.pk]),
+            True,
+        ),
+        Route("catalog:product_create", "GET", reverse("catalog:product_create"), True),
+        Route(
+            "catalog:product_update",
+            "GET",
+            reverse("catalog:product_update", args=[product.pk]),
+            True,
+        ),
+        Route("catalog:blog", "GET", reverse("catalog:blog"), False),
+        Route("catalog:blog_create", "GET", reverse("catalog:blog_create"), False),
+        Route(
+            "catalog:detail_blog",
+            "GET",
+            reverse("catalog:detail_blog", args=[blog.pk]),
+            False,
+        ),
+        Route(
+            "catalog:update_blog",
+            "GET",
+            reverse("catalog:update_blog", args=[blog.pk]),
+            False,
+        ),
+        Route(
+            "catalog:delete_blog",
+            "GET",
+            reverse("catalog:delete_blog", args=[blog.pk]),
+            False,
+        ),
+        Route(
+            "catalog:export:csv",
+            "GET",
+            reverse("catalog:export", args=["csv"]),
+            True,
+        ),
+        Route(
+            "catalog:export:jsonl",
+            "GET",
+            reverse("catalog:export", args=["jsonl"]),
+            True,
+        ),
+        # Запись: переключает публикацию, reset возвращает прежнее состояние
+        Route(
+            "catalog:toggle_activity",
+            "GET",
+            reverse("catalog:toggle_activity", args=[blog.pk]),
+            False,
+            reset=reset_blog,
+        ),
+        Route(
+            "catalog:bulk_publish",
+            "POST",
+            reverse("catalog:bulk_publish", args=["product"]),
+            True,
+            data={"action": "unpublish", "pk": [product.pk]},
+            reset=reset_product,
+        ),
+        Route("users:login", "GET", reverse("users:login"), False),
+        Route("users:register", "GET", reverse("users:register"), False),
+        Route("users:new_password", "GET", reverse("users:new_password"), False),
+        Route(
+            "users:email-confirm",
+            "GET",
+            reverse("users:email-confirm", args=["bench-invalid-token"]),
+            False,
+        ),
+        Route("users:logout", "POST", reverse("users:logout"), True),
+    ]
+
+
+def summarize(timings, queries, allocations=None):
+    """
+    Перцентили времени ответа в миллисекундах, SQL-запросы на запрос
+    и пик выделенной памяти на запрос в килобайтах
+    """
+    cuts = statistics.quantiles(timings, n=100, method="inclusive")
+    result = {
+        "requests": len(timings),
+        "mean_ms": round(statistics.fmean(timings), 3),
+        "p50_ms": round(cuts[49], 3),
+        "p95_ms": round(cuts[94], 3),
+        "p99_ms": round(cuts[98], 3),
+        "queries": max(queries) if queries else None,
+    }
+    if allocations:
+        result["alloc_peak_kb"] = round(statistics.median(allocations) / 1024, 1)
+    return result
+
+
+def _queries(server_timing):
+    match = QUERIES_RE.search(server_timing or "")
+    return int(match.group(1)) if match else None
+
+
+def measure_client(
+    method, url, user, iterations, warmup, allocations=True, data=None, reset=None
+):
+    """
+    Замеры через тестовый клиент Django, без сети. reset вызывается
+    после каждого запроса и в замер не входит
+    """
+    client = Client()
+    if user is not None:
+        client.force_login(user)
+    request = getattr(client, method.lower())
+
+    def run():
+        response = request(url, data)
+        # Потоковый ответ читается целиком, как его прочитал бы клиент
+        if response.streaming:
+            b"".join(response.streaming_content)
+        return response
+
+    def after():
+        if reset is not None:
+            reset()
+
+    for _ in range(warmup):
+        run()
+        after()
+    timings, queries, statuses = [], [], set()
+    for _ in range(iterations):
+        started = time.perf_counter()
+        response = run()
+        timings.append((time.perf_counter() - started) * 1000)
+        after()
+        statuses.add(response.status_code)
+        count = _queries(response.get("Server-Timing"))
+        if count is not None:
+            queries.append(count)
+
+    peaks = []
+    if allocations:
+        tracemalloc.start()
+        try:
+            for _ in range(min(iterations, 10)):
+                tracemalloc.reset_peak()
+                baseline = tracemalloc.get_traced_memory()[0]
+                run()
+                peaks.append(tracemalloc.get_traced_memory()[1] - baseline)
+                after()
+        finally:
+            tracemalloc.stop()
+
+    result = summarize(timings, queries, peaks)
+    result["status"] = sorted(statuses)
+    return result
+
+
+def measure_queryset(queryset, rows, iterations=5):
+    """
+    Загружает rows записей набора запросов и возвращает время, объем
+    данных из PostgreSQL и пик выделенной памяти в пересчете на 1000 строк
+    """
+    queryset = queryset[:rows]
+    sql, params = queryset.query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT count(*), coalesce(sum(pg_column_size(t.*)), 0) FROM ({sql}) t",
+            params,
+        )
+        count, db_bytes = cursor.fetchone()
+    if not count:
+        return {"rows": 0}
+
+    timings, peaks = [], []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        list(queryset.all())
+        timings.append((time.perf_counter() - started) * 1000)
+    tracemalloc.start()
+    try:
+        for _ in range(iterations):
+            tracemalloc.reset_peak()
+            baseline = tracemalloc.get_traced_memory()[0]
+            objects = list(queryset.all())
+            peaks.append(tracemalloc.get_traced_memory()[1] - baseline)
+            del objects
+    finally:
+        tracemalloc.stop()
+
+    scale = 1000 / count
+    return {
+        "rows": count,
+        "ms_per_1000": round(statistics.median(timings) * scale, 3),
+        "db_kb_per_1000": round(db_bytes * scale / 1024, 1),
+        "alloc_kb_per_1000": round(statistics.median(peaks) * scale / 1024, 1),
+    }
+
+
+def session_cookie(user):
+    """
+    Cookie сессии и CSRF для запросов к настоящему серверу
+    """
+    csrf_token = get_random_string(32)
+    cookies = {"csrftoken": csrf_token}
+    if user is not None:
+        client = Client()
+        client.force_login(user)
+        cookies.update({name: morsel.value for name, morsel in client.cookies.items()})
+    return "; ".join(f"{name}={value}" for name, value in cookies.items()), csrf_token
+
+
+def http_request(host, port, method, url, headers, data=None):
+    connection = http.client.HTTPConnection(host, port, timeout=30)
+    body = None
+    if data is not None:
+        body = urlencode(data, doseq=True)
+        headers = {**headers, "Content-Type": "application/x-www-form-urlencoded"}
+    try:
+        connection.request(method, url, body=body, headers=headers)
+        response = connection.getresponse()
+        response.read()
+        return response.status, response.getheader("Server-Timing")
+    finally:
+        connection.close()
+
+
+def measure_server(
+    address, method, url, user, iterations, warmup, data=None, reset=None
+):
+    """
+    Замеры через HTTP-запросы к запущенному серверу. reset вызывается
+    после каждого запроса и в замер не входит
+    """
+    host, port = address
+    cookie, csrf_token = session_cookie(user)
+    headers = {"Cookie": cookie, "X-CSRFToken": csrf_token}
+    for _ in range(warmup):
+        http_request(host, port, method, url, headers, data)
+        if reset is not None:
+            reset()
+    timings, queries, statuses = [], [], set()
+    for _ in range(iterations):
+        started = time.perf_counter()
+        status, server_timing = http_request(host, port, method, url, headers, data)
+        timings.append((time.perf_counter() - started) * 1000)
+        if reset is not None:
+            reset()
+        statuses.add(status)
+        count = _queries(server_timing)
+        if count is not None:
+            queries.append(count)
+    result = summarize(timings, queries)
+    result["status"] = sorted(statuses)
+    return result
+
+
+def measure_concurrency(address, url, concurrency, requests):
+    """
+    Отправляет requests запросов с concurrency одновременными клиентами
+    и возвращает пропускную способность, перцентили и число ошибок
+    """
+    host, port = address
+
+    def request(_):
+        started = time.perf_counter()
+        try:
+            status, _ = http_request(host, port, "GET", url, {})
+        except OSError:
+            status = None
+        return status, (time.perf_counter() - started) * 1000
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(request, range(requests)))
+    elapsed = time.perf_counter() - started
+
+    timings = [timing for status, timing in results if status == 200]
+    result = summarize(timings, []) if len(timings) > 1 else {"requests": len(timings)}
+    result.update(
+        concurrency=concurrency,
+        errors=len(results) - len(timings),
+        rps=round(len(timings) / elapsed, 1),
+    )
+    return result
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class QuietWSGIRequestHandler(WSGIRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+@contextmanager
+def wsgi_server(threaded=False):
+    """
+    WSGI-сервер Django в фоновом потоке. Однопоточный сервер держит
+    одно соединение с БД, как процесс-воркер; многопоточный открывает
+    соединение на каждый поток запроса
+    """
+    from config.wsgi import application
+
+    server_class = ThreadedWSGIServer if threaded else WSGIServer
+    server = server_class(("127.0.0.1", free_port()), QuietWSGIRequestHandler)
+    server.set_app(application)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield server.server_address
+    finally:
+        server.shutdown()
+        server.server_close()
+        thread.join()
+
+
+@contextmanager
+def asgi_server():
+    """
+    Сервер uvicorn с ASGI-приложением в фоновом потоке
+    """
+    import uvicorn
+
+    from config.asgi import application
+
+    address = ("127.0.0.1", free_port())
+    config = uvicorn.Config(
+        application,
+        host=address[0],
+        port=address[1],
+        lifespan="off",
+        log_level="warning",
+    )
+    server = uvicorn.Server(config)
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        if not thread.is_alive():
+            raise RuntimeError("Сервер uvicorn не запустился")
+        time.sleep(0.05)
+    try:
+        yield address
+    finally:
+        server.should_exit = True
+        thread.join()
@@ -0,0 +1,35 @@
+from django.conf import settings
+from django.utils.functional import SimpleLazyObject
+
+from catalog.permissions import can_moderate_product
+from catalog.services import get_category_navigation
+from config.settings import CACHE_ENABLED
+
+
+def categories(request):
+    """
+    Категории для подвала страницы. Передается функция, поэтому кэш
+    читается только в шаблонах, которые выводят категории
+    """
+    return {"footer_categories": get_category_navigation}
+
+
+def fragment_cache(request):
+    """
+    Время жизни фрагментов шаблонов. Без общего кэша фрагменты
+    не кэшируются, иначе сброс в одном процессе не дошел бы до остальных
+    """
+    timeout = settings.FRAGMENT_CACHE_TIMEOUT if CACHE_ENABLED else 0
+    return {"fragment_cache_timeout": timeout}
+
+
+def permissions(request):
+    """
+    Право модерации товаров, вычисляется один раз за запрос и только
+    если шаблон его использует
+    """
+    return {
+        "can_moderate_product": SimpleLazyObject(
+            lambda: can_moderate_product(request.user)
+        )
+    }
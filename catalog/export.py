@@ -0,0 +1,107 @@
+import csv
+import json
+import zlib
+from itertools import islice
+
+from asgiref.sync import sync_to_async
+
+from catalog.models import Product
+
+# Столбцы выгрузки и соответствующие им поля; категория и активная версия
+# присоединяются в том же запросе, без создания объектов моделей
+EXPORT_FIELDS = (
+    ("id", "pk"),
+    ("name", "name"),
+    ("category", "category__name"),
+    ("price", "price"),
+    ("version_name", "active_version__version_name"),
+    ("version_number", "active_version__version_number"),
+    ("updated_at", "updated_at"),
+)
+EXPORT_COLUMNS = tuple(column for column, _ in EXPORT_FIELDS)
+EXPORT_FORMATS = ("csv", "jsonl")
+EXPORT_CHUNK_SIZE = 2000
+
+_UPDATED_AT = EXPORT_COLUMNS.index("updated_at")
+
+
+def export_queryset(queryset=None):
+    """
+    Товары для выгрузки партнерам, по умолчанию только опубликованные
+    """
+    if queryset is None:
+        queryset = Product.objects.published()
+    return queryset.order_by("pk").values_list(
+        *(lookup for _, lookup in EXPORT_FIELDS)
+    )
+
+
+class _Line:
+    # csv.writer пишет в объект с методом write; строку забираем сразу
+    def write(self, value):
+        return value
+
+
+class ExportEncoder:
+    """
+    Превращает пачки строк выгрузки в сжатые gzip байты. Состояние
+    сжатия хранится между пачками, поэтому в памяти остается только
+    текущая пачка
+    """
+
+    def __init__(self, export_format):
+        if export_format not in EXPORT_FORMATS:
+            raise ValueError(f"Неизвестный формат выгрузки: {export_format}")
+        self.export_format = export_format
+        self.compressor = zlib.compressobj(wbits=16 + zlib.MAX_WBITS)
+        self.csv_writer = csv.writer(_Line())
+
+    def _lines(self, rows):
+        for row in rows:
+            row = list(row)
+            if row[_UPDATED_AT] is not None:
+                row[_UPDATED_AT] = row[_UPDATED_AT].isoformat()
+            if self.export_format == "csv":
+                yield self.csv_writer.writerow(row)
+            else:
+                yield json.dumps(dict(zip(EXPORT_COLUMNS, row)), ensure_ascii=False)
+                yield "\n"
+
+    def start(self):
+        if self.export_format == "csv":
+            return self.compressor.compress(
+                self.csv_writer.writerow(EXPORT_COLUMNS).encode()
+            )
+        return b""
+
+    def encode(self, rows):
+        return self.compressor.compress("".join(self._lines(rows)).encode())
+
+    def finish(self):
+        return self.compressor.flush()
+
+
+def export_products(export_format, queryset=None, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Выгрузка товаров в CSV или JSONL, сжатая gzip, по частям.
+    Строки читаются серверным курсором пачками по chunk_size
+    """
+    encoder = ExportEncoder(export_format)
+    rows = export_queryset(queryset).iterator(chunk_size=chunk_size)
+    yield encoder.start()
+    while batch := list(islice(rows, chunk_size)):
+        if data := encoder.encode(batch):
+            yield data
+    yield encoder.finish()
+
+
+async def aexport_products(export_format, queryset=None, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Асинхронный вариант export_products для ASGI. aiterator() у values_list
+    выполняет запрос в потоке цикла событий, поэтому части синхронной
+    выгрузки, вместе с чтением и сжатием, забираются через sync_to_async
+    """
+    chunks = export_products(export_format, queryset, chunk_size)
+    next_chunk = sync_to_async(next)
+    while (chunk := await next_chunk(chunks, None)) is not None:
+        yield chunk
@@ -1,6 +1,9 @@
-from django.forms import ModelForm, BooleanField, forms
+from django.db import transaction
+from django.forms import BaseInlineFormSet, ModelForm, BooleanField, forms
 
 from catalog.models import Product, Version
+from catalog.moderation import get_forbidden_word_matcher
+from catalog.services import get_categories_from_cache
 
 class StyleFormMixin:
     def __init__(self, *args, **kwargs):
@@ -10,33 +13,90 @@ class StyleFormMixin:
                 field.widget.attrs["class"] = "form-check-input"
             else:
                 field.widget.attrs["class"] = "form-control"
-class ProductForm(StyleFormMixin, ModelForm):
+
+
+class CategoryChoicesMixin:
+    """
+    Берет варианты выбора категории из кэша вместо запроса к БД
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        field = self.fields.get("category")
+        if field is not None:
+            field.choices = [("", field.empty_label), *get_categories_from_cache()]
+
+
+class ProductForm(StyleFormMixin, CategoryChoicesMixin, ModelForm):
     class Meta:
         model = Product
         fields = '__all__'
 
-    forbidden_words = ['казино', 'криптовалюта', 'крипта', 'биржа', 'дешево', 'бесплатно', 'обман', 'полиция', 'радар']
+    def check_forbidden_words(self, text, field_label):
+        words = dict.fromkeys(match.word for match in get_forbidden_word_matcher().find(text))
+        if words:
+            raise forms.ValidationError(
+                [f'{field_label} не должно содержать слово "{word}"' for word in words]
+            )
 
     def clean_name(self):
         cleaned_data = self.cleaned_data['name']
-        for forbidden_word in self.forbidden_words:
-            if forbidden_word in cleaned_data.lower():
-                raise forms.ValidationError(f'Наименование не должно содержать слово "{forbidden_word}"')
+        self.check_forbidden_words(cleaned_data, 'Наименование')
         return cleaned_data
 
     def clean_description(self):
         cleaned_data = self.cleaned_data['description']
-        for forbidden_word in self.forbidden_words:
-            if forbidden_word in cleaned_data.lower():
-                raise forms.ValidationError(f'Описание не должно содержать слово "{forbidden_word}"')
+        self.check_forbidden_words(cleaned_data, 'Описание')
         return cleaned_data
+
+
 class VersionForm(StyleFormMixin, ModelForm):
     class Meta:
         model = Version
         fields = '__all__'
 
 
-class ProductModeratorForm(StyleFormMixin, ModelForm):
+class VersionFormSet(BaseInlineFormSet):
+    """
+    Версии товара. Активной может быть только одна версия, а указатель
+    Product.active_version обновляется вместе с сохранением версий
+    """
+
+    def active_forms(self):
+        return [
+            form
+            for form in self.forms
+            if form.cleaned_data.get("is_version_active")
+            and not self._should_delete_form(form)
+        ]
+
+    def clean(self):
+        super().clean()
+        if any(self.errors):
+            return
+        if len(self.active_forms()) > 1:
+            raise forms.ValidationError("Активной может быть только одна версия")
+
+    def save(self, commit=True):
+        if not commit:
+            return super().save(commit)
+        with transaction.atomic():
+            # Сначала снимаем отметку со старой активной версии, иначе
+            # уникальный индекс не даст сохранить новую
+            activated = [
+                form.instance.pk for form in self.active_forms() if form.has_changed()
+            ]
+            if activated:
+                self.instance.versions.filter(is_version_active=True).exclude(
+                    pk__in=[pk for pk in activated if pk is not None]
+                ).update(is_version_active=False)
+            saved = super().save(commit)
+            Product.objects.filter(pk=self.instance.pk).refresh_active_versions()
+            self.instance.refresh_from_db(fields=["active_version"])
+        return saved
+
+
+class ProductModeratorForm(StyleFormMixin, CategoryChoicesMixin, ModelForm):
     class Meta:
         model = Product
         fields = ('description', 'category', 'is_published')
\ No newline at end of file
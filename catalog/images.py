@@ -0,0 +1,81 @@
+import posixpath
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps
+
+# Ширина вариантов изображения в пикселях (для плотности 1x)
+VARIANTS = {
+    "card": 320,
+    "detail": 800,
+}
+DENSITIES = (1, 2)
+FORMATS = {
+    "webp": ("WEBP", {"quality": 80, "method": 4}),
+    "jpg": ("JPEG", {"quality": 82, "optimize": True, "progressive": True}),
+}
+
+
+def variant_name(name, variant, density, extension):
+    """
+    Возвращает путь к варианту изображения:
+    photo/foo.jpg -> photo/variants/foo.card-2x.webp
+    """
+    directory, filename = posixpath.split(name)
+    stem = posixpath.splitext(filename)[0]
+    suffix = "" if density == 1 else f"-{density}x"
+    return posixpath.join(
+        directory, "variants", f"{stem}.{variant}{suffix}.{extension}"
+    )
+
+
+def variant_names(name):
+    """
+    Пути ко всем вариантам изображения
+    """
+    return [
+        variant_name(name, variant, density, extension)
+        for variant in VARIANTS
+        for density in DENSITIES
+        for extension in FORMATS
+    ]
+
+
+def has_variants(name, storage=default_storage):
+    """
+    Проверяет, созданы ли варианты для изображения
+    """
+    return storage.exists(variant_name(name, "card", 1, "webp"))
+
+
+def generate_variants(name, storage=default_storage, force=False):
+    """
+    Создает уменьшенные варианты изображения во всех форматах
+    и возвращает количество записанных файлов
+    """
+    if not name or (not force and has_variants(name, storage)):
+        return 0
+
+    with storage.open(name, "rb") as file:
+        image = Image.open(file)
+        image = ImageOps.exif_transpose(image)
+        image.load()
+    if image.mode not in ("RGB", "L"):
+        image = image.convert("RGB")
+
+    written = 0
+    for variant, width in VARIANTS.items():
+        for density in DENSITIES:
+            size = width * density
+            resized = image.copy()
+            resized.thumbnail((size, size), Image.LANCZOS)
+            for extension, (image_format, params) in FORMATS.items():
+                buffer = BytesIO()
+                resized.save(buffer, image_format, **params)
+                target = variant_name(name, variant, density, extension)
+                if storage.exists(target):
+                    storage.delete(target)
+                storage.save(target, ContentFile(buffer.getvalue()))
+                written += 1
+    return written
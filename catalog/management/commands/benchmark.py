@@ -0,0 +1,108 @@
+import json
+import subprocess
+from contextlib import ExitStack
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.core.management import BaseCommand, CommandError
+from django.test.utils import override_settings
+
+from catalog.benchmarks import (
+    asgi_server,
+    get_routes,
+    measure_client,
+    measure_server,
+    wsgi_server,
+)
+from catalog.models import Blog, Category, Product
+from users.models import User
+
+SERVERS = {"wsgi": wsgi_server, "asgi": asgi_server}
+
+
+class Command(BaseCommand):
+    help = (
+        "Замеряет время ответа, SQL-запросы и память для всех маршрутов "
+        "catalog и users на данных команды seed_benchmark"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--iterations", type=int, default=50)
+        parser.add_argument("--warmup", type=int, default=5)
+        parser.add_argument(
+            "--mode",
+            action="append",
+            choices=["client", *SERVERS],
+            help="Способ запуска, можно указать несколько (по умолчанию client и wsgi)",
+        )
+        parser.add_argument("--route", action="append", help="Замерять только эти маршруты")
+        parser.add_argument("--output", default="benchmark.json", help="Файл с результатами")
+
+    @staticmethod
+    def git_commit():
+        try:
+            return subprocess.run(
+                ["git", "rev-parse", "--short", "HEAD"],
+                cwd=settings.BASE_DIR,
+                capture_output=True,
+                text=True,
+                check=True,
+            ).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
+
+    def handle(self, *args, **options):
+        user, routes = get_routes()
+        if not routes:
+            raise CommandError("Нет синтетических данных, запустите seed_benchmark")
+        if options["route"]:
+            routes = [route for route in routes if route.name in options["route"]]
+        modes = options["mode"] or ["client", "wsgi"]
+        iterations, warmup = options["iterations"], options["warmup"]
+
+        results = {
+            "commit": self.git_commit(),
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "iterations": iterations,
+            "dataset": {
+                "categories": Category.objects.count(),
+                "products": Product.objects.count(),
+                "blogs": Blog.objects.count(),
+                "users": User.objects.count(),
+            },
+            "routes": {},
+        }
+        # Количество SQL-запросов берется из заголовка Server-Timing
+        with override_settings(PERF_SAMPLE_RATE=1, PERF_SERVER_TIMING=True):
+            for mode in modes:
+                with ExitStack() as stack:
+                    if mode != "client":
+                        try:
+                            address = stack.enter_context(SERVERS[mode]())
+                        except ImportError as error:
+                            self.stderr.write(f"{mode}: сервер недоступен ({error})")
+                            continue
+                    for route in routes:
+                        arguments = (
+                            route.method,
+                            route.url,
+                            user if route.login else None,
+                            iterations,
+                            warmup,
+                        )
+                        write = {"data": route.data, "reset": route.reset}
+                        if mode == "client":
+                            result = measure_client(*arguments, **write)
+                        else:
+                            result = measure_server(address, *arguments, **write)
+                        results["routes"].setdefault(route.name, {})[mode] = result
+                        self.stdout.write(
+                            f"{mode:6} {route.name:28} p50 {result['p50_ms']:8.2f} мс  "
+                            f"p95 {result['p95_ms']:8.2f} мс  "
+                            f"p99 {result['p99_ms']:8.2f} мс  "
+                            f"SQL {result['queries']}  статус {result['status']}"
+                        )
+
+        with open(options["output"], "w", encoding="utf-8") as file:
+            json.dump(results, file, ensure_ascii=False, indent=2)
+        self.stdout.write(f"Результаты записаны в {options['output']}")
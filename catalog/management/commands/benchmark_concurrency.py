@@ -0,0 +1,67 @@
+import json
+from contextlib import ExitStack
+from functools import partial
+
+from django.conf import settings
+from django.core.management import BaseCommand, CommandError
+from django.urls import reverse
+
+from catalog.benchmarks import asgi_server, measure_concurrency, wsgi_server
+
+SERVERS = {
+    "wsgi": partial(wsgi_server, threaded=True),
+    "asgi": asgi_server,
+}
+ROUTES = ("catalog:product_list", "catalog:blog")
+
+
+class Command(BaseCommand):
+    help = (
+        "Сравнивает пропускную способность многопоточного WSGI-сервера и "
+        "uvicorn при росте числа одновременных клиентов. Асинхронные "
+        "представления включаются переменной окружения ASYNC_VIEWS=True"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--concurrency", type=int, nargs="+", default=[1, 8, 32, 64]
+        )
+        parser.add_argument(
+            "--requests", type=int, default=400, help="Запросов на каждый уровень"
+        )
+        parser.add_argument("--route", action="append", choices=ROUTES)
+        parser.add_argument("--output", help="Файл JSON с результатами")
+
+    def handle(self, *args, **options):
+        results = {"async_views": settings.ASYNC_VIEWS, "servers": {}}
+        for server_name, server in SERVERS.items():
+            with ExitStack() as stack:
+                try:
+                    address = stack.enter_context(server())
+                except ImportError as error:
+                    self.stderr.write(f"{server_name}: сервер недоступен ({error})")
+                    continue
+                for route in options["route"] or ROUTES:
+                    url = reverse(route)
+                    # Прогрев: соединения с БД, кэш шаблонов
+                    measure_concurrency(address, url, 1, 5)
+                    for concurrency in options["concurrency"]:
+                        result = measure_concurrency(
+                            address, url, concurrency, options["requests"]
+                        )
+                        results["servers"].setdefault(server_name, {}).setdefault(
+                            route, []
+                        ).append(result)
+                        self.stdout.write(
+                            f"{server_name:5} {route:22} клиентов {concurrency:3}  "
+                            f"{result['rps']:8.1f} запр/с  "
+                            f"p50 {result.get('p50_ms', 0):8.2f} мс  "
+                            f"p99 {result.get('p99_ms', 0):8.2f} мс  "
+                            f"ошибок {result['errors']}"
+                        )
+
+        if not results["servers"]:
+            raise CommandError("Не удалось запустить ни один сервер")
+        if options["output"]:
+            with open(options["output"], "w", encoding="utf-8") as file:
+                json.dump(results, file, ensure_ascii=False, indent=2)
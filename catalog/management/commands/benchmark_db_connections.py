@@ -0,0 +1,66 @@
+import statistics
+import time
+
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management import BaseCommand
+from django.db import connection
+from django.db.backends.signals import connection_created
+from django.test import RequestFactory
+from django.urls import reverse
+
+
+class Command(BaseCommand):
+    help = (
+        "Сравнивает время запроса к списку товаров с новым соединением с БД "
+        "на каждый запрос и с постоянным соединением"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=200)
+        parser.add_argument("--conn-max-age", type=int, default=60)
+
+    def run(self, handler, environ, requests, conn_max_age):
+        # Запросы проходят через WSGI-обработчик, поэтому соединение закрывается
+        # или переиспользуется так же, как на сервере
+        connection.close()
+        connection.settings_dict["CONN_MAX_AGE"] = conn_max_age
+        connections_opened = 0
+
+        def count_connection(**kwargs):
+            nonlocal connections_opened
+            connections_opened += 1
+
+        connection_created.connect(count_connection)
+        timings = []
+        try:
+            for _ in range(requests):
+                started = time.perf_counter()
+                response = handler(dict(environ), lambda status, headers: None)
+                b"".join(response)
+                response.close()
+                timings.append((time.perf_counter() - started) * 1000)
+        finally:
+            connection_created.disconnect(count_connection)
+        return timings, connections_opened
+
+    def handle(self, *args, **options):
+        handler = WSGIHandler()
+        environ = RequestFactory().get(reverse("catalog:product_list")).environ
+        original_max_age = connection.settings_dict["CONN_MAX_AGE"]
+        try:
+            for title, max_age in (
+                ("Новое соединение на запрос", 0),
+                ("Постоянное соединение", options["conn_max_age"]),
+            ):
+                timings, opened = self.run(
+                    handler, environ, options["requests"], max_age
+                )
+                self.stdout.write(
+                    f"{title} (CONN_MAX_AGE={max_age}): "
+                    f"среднее {statistics.mean(timings):.2f} мс, "
+                    f"медиана {statistics.median(timings):.2f} мс, "
+                    f"открыто соединений: {opened}"
+                )
+        finally:
+            connection.settings_dict["CONN_MAX_AGE"] = original_max_age
+            connection.close()
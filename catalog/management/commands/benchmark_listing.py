@@ -0,0 +1,55 @@
+import json
+
+from django.core.management import BaseCommand, CommandError
+
+from catalog.benchmarks import measure_queryset
+from catalog.models import Blog, Product
+
+# Наборы запросов списков до и после выборки только полей карточки
+QUERYSETS = {
+    "product_list": (
+        lambda: Product.objects.published().with_listing_data(),
+        lambda: Product.objects.published().for_listing(),
+    ),
+    "blog_list": (
+        lambda: Blog.objects.published(),
+        lambda: Blog.objects.published().for_listing(),
+    ),
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Сравнивает загрузку списков товаров и публикаций целиком и только "
+        "с полями карточки: время, объем данных из БД и память на 1000 строк"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=1000, help="Строк в выборке")
+        parser.add_argument("--iterations", type=int, default=5)
+        parser.add_argument("--output", help="Файл JSON с результатами")
+
+    def handle(self, *args, **options):
+        results = {}
+        for name, (full, listing) in QUERYSETS.items():
+            for variant, queryset in (("full", full), ("listing", listing)):
+                result = measure_queryset(
+                    queryset(), options["rows"], options["iterations"]
+                )
+                results.setdefault(name, {})[variant] = result
+                if not result["rows"]:
+                    continue
+                self.stdout.write(
+                    f"{name:13} {variant:8} строк {result['rows']:6}  "
+                    f"{result['ms_per_1000']:8.2f} мс  "
+                    f"из БД {result['db_kb_per_1000']:8.1f} КБ  "
+                    f"память {result['alloc_kb_per_1000']:8.1f} КБ  (на 1000 строк)"
+                )
+
+        if not any(result["full"]["rows"] for result in results.values()):
+            raise CommandError(
+                "Нет опубликованных записей, заполните БД командой seed_benchmark"
+            )
+        if options["output"]:
+            with open(options["output"], "w", encoding="utf-8") as file:
+                json.dump(results, file, ensure_ascii=False, indent=2)
@@ -0,0 +1,58 @@
+import json
+
+from django.core.management import BaseCommand, CommandError
+
+METRICS = ("p50_ms", "p95_ms", "p99_ms", "queries", "alloc_peak_kb")
+
+
+class Command(BaseCommand):
+    help = "Сравнивает два файла результатов команды benchmark"
+
+    def add_arguments(self, parser):
+        parser.add_argument("baseline", help="Результаты до изменений")
+        parser.add_argument("current", help="Результаты после изменений")
+        parser.add_argument(
+            "--threshold",
+            type=float,
+            default=10,
+            help="Допустимое ухудшение времени и памяти, проценты",
+        )
+
+    @staticmethod
+    def load(path):
+        with open(path, encoding="utf-8") as file:
+            return json.load(file)
+
+    def handle(self, *args, **options):
+        baseline = self.load(options["baseline"])
+        current = self.load(options["current"])
+        self.stdout.write(f"{baseline.get('commit')} -> {current.get('commit')}")
+
+        regressions = []
+        for route, modes in sorted(current["routes"].items()):
+            for mode, result in sorted(modes.items()):
+                before = baseline["routes"].get(route, {}).get(mode)
+                if before is None:
+                    continue
+                changes = []
+                for metric in METRICS:
+                    old, new = before.get(metric), result.get(metric)
+                    if old is None or new is None:
+                        continue
+                    if metric == "queries":
+                        # Любой лишний SQL-запрос считается ухудшением
+                        changes.append(f"{metric} {old} -> {new}")
+                        if new > old:
+                            regressions.append(f"{mode} {route}: {metric} {old} -> {new}")
+                        continue
+                    delta = (new - old) / old * 100 if old else 0
+                    changes.append(f"{metric} {delta:+.1f}%")
+                    if delta > options["threshold"]:
+                        regressions.append(f"{mode} {route}: {metric} {delta:+.1f}%")
+                self.stdout.write(f"{mode:6} {route:28} " + ", ".join(changes))
+
+        if regressions:
+            raise CommandError(
+                "Ухудшения:\n" + "\n".join(regressions)
+            )
+        self.stdout.write("Ухудшений нет")
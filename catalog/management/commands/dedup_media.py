@@ -0,0 +1,94 @@
+import hashlib
+import os
+
+from django.conf import settings
+from django.core.files import File
+from django.core.management import BaseCommand
+
+from catalog.images import generate_variants, variant_names
+from catalog.models import IMAGE_FIELDS, MediaBlob
+from catalog.storage import media_storage
+
+
+class Command(BaseCommand):
+    help = "Переносит загруженные файлы в хранилище с дедупликацией по содержимому"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Только посчитать, сколько места освободится",
+        )
+
+    @staticmethod
+    def get_legacy_names():
+        # Имена файлов, которые еще не перенесены в хранилище
+        names = set()
+        for model, field in IMAGE_FIELDS:
+            names.update(
+                model.objects.exclude(**{f"{field}__isnull": True})
+                .exclude(**{field: ""})
+                .exclude(**{f"{field}__startswith": "blobs/"})
+                .values_list(field, flat=True)
+            )
+        return sorted(name for name in names if media_storage.exists(name))
+
+    @staticmethod
+    def get_media_size():
+        total = 0
+        for root, _, files in os.walk(settings.MEDIA_ROOT):
+            total += sum(os.path.getsize(os.path.join(root, file)) for file in files)
+        return total
+
+    @staticmethod
+    def count_references(name):
+        return sum(
+            model.objects.filter(**{field: name}).count()
+            for model, field in IMAGE_FIELDS
+        )
+
+    def dry_run(self, names):
+        sizes_by_digest = {}
+        for name in names:
+            hasher = hashlib.sha256()
+            with media_storage.open(name, "rb") as file:
+                for chunk in file.chunks():
+                    hasher.update(chunk)
+            sizes_by_digest.setdefault(hasher.hexdigest(), []).append(
+                media_storage.size(name)
+            )
+        reclaimed = sum(sum(sizes[1:]) for sizes in sizes_by_digest.values())
+        self.stdout.write(
+            f"Файлов: {len(names)}, уникальных: {len(sizes_by_digest)}, "
+            f"можно освободить байт: {reclaimed}"
+        )
+
+    def handle(self, *args, **options):
+        names = self.get_legacy_names()
+        if options["dry_run"]:
+            return self.dry_run(names)
+
+        size_before = self.get_media_size()
+        blob_names = set()
+        for name in names:
+            with media_storage.open(name, "rb") as file:
+                blob_name = media_storage.save(name, File(file))
+            for model, field in IMAGE_FIELDS:
+                model.objects.filter(**{field: name}).update(**{field: blob_name})
+            blob_names.add(blob_name)
+
+            for old_name in [name, *variant_names(name)]:
+                if media_storage.exists(old_name):
+                    media_storage.delete(old_name)
+            generate_variants(blob_name)
+            self.stdout.write(f"{name} -> {blob_name}")
+
+        # save() добавляет одну ссылку на исходный файл, а на него может
+        # ссылаться несколько записей: счетчик равен числу ссылающихся строк
+        for blob_name in blob_names:
+            MediaBlob.objects.filter(name=blob_name).update(
+                refcount=self.count_references(blob_name)
+            )
+
+        reclaimed = size_before - self.get_media_size()
+        self.stdout.write(f"Перенесено файлов: {len(names)}, освобождено байт: {reclaimed}")
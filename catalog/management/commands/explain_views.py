@@ -0,0 +1,124 @@
+import json
+
+from django.core.management import BaseCommand, CommandError
+from django.db import connection
+from django.test import RequestFactory
+
+from catalog.benchmarks import WORDS
+from catalog.models import Blog, Category, Product, Version
+from catalog.pagination import KeysetPaginator
+from catalog.services import category_navigation_queryset
+from catalog.views import BlogListView, ProductListView, ProductSearchView
+
+
+class Command(BaseCommand):
+    help = (
+        "Выполняет EXPLAIN (ANALYZE, BUFFERS) для запросов страниц витрины "
+        "и завершается ошибкой, если встретилось последовательное чтение "
+        "таблицы больше порога"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--min-rows",
+            type=int,
+            default=10000,
+            help="Последовательное чтение таблиц меньше этого размера допустимо",
+        )
+        parser.add_argument(
+            "--max-share",
+            type=float,
+            default=0.5,
+            help=(
+                "Последовательное чтение, которое возвращает большую долю "
+                "строк таблицы, дешевле индекса и допустимо"
+            ),
+        )
+        parser.add_argument(
+            "--verbose-plans", action="store_true", help="Выводить планы целиком"
+        )
+
+    @staticmethod
+    def list_queryset(view_class, **params):
+        # Запрос первой страницы в том виде, в каком его выполняет представление
+        view = view_class()
+        view.setup(RequestFactory().get("/", params))
+        queryset = view.get_queryset()
+        paginator = view.get_paginator(queryset, view.paginate_by)
+        if isinstance(paginator, KeysetPaginator):
+            return paginator._page_queryset(None)[0]
+        return queryset[: view.paginate_by]
+
+    def get_queries(self):
+        queries = {
+            "product_list": self.list_queryset(ProductListView),
+            "product_search": self.list_queryset(ProductSearchView, q=WORDS[0]),
+            "blog_list": self.list_queryset(BlogListView),
+            "footer_categories": category_navigation_queryset(),
+        }
+        category = Category.objects.order_by("pk").first()
+        if category is not None:
+            queries["product_list_category"] = self.list_queryset(
+                ProductListView, category=category.pk
+            )
+        product = Product.objects.published().order_by("pk").first()
+        if product is not None:
+            queries["product_detail"] = Product.objects.with_listing_data().filter(
+                pk=product.pk
+            )
+            queries["product_versions"] = Version.objects.filter(product=product)
+        blog = Blog.objects.order_by("pk").first()
+        if blog is not None:
+            queries["blog_detail"] = Blog.objects.filter(pk=blog.pk)
+        return queries
+
+    @staticmethod
+    def table_rows():
+        with connection.cursor() as cursor:
+            # reltuples равен -1, пока таблица не анализировалась
+            cursor.execute(
+                "SELECT s.relname, GREATEST(c.reltuples, s.n_live_tup) "
+                "FROM pg_stat_user_tables s JOIN pg_class c ON c.oid = s.relid"
+            )
+            return {name: rows for name, rows in cursor.fetchall()}
+
+    def walk(self, plan):
+        yield plan
+        for child in plan.get("Plans", ()):
+            yield from self.walk(child)
+
+    def handle(self, *args, **options):
+        rows = self.table_rows()
+        problems = []
+        for name, queryset in self.get_queries().items():
+            raw_plan = queryset.explain(format="json", analyze=True, buffers=True)
+            plan = json.loads(raw_plan)[0]
+            if options["verbose_plans"]:
+                self.stdout.write(json.dumps(plan, ensure_ascii=False, indent=2))
+            self.stdout.write(
+                f"{name}: {plan['Execution Time']:.2f} мс, "
+                f"буферов прочитано {plan['Plan'].get('Shared Read Blocks', 0)}, "
+                f"из кэша {plan['Plan'].get('Shared Hit Blocks', 0)}"
+            )
+            for node in self.walk(plan["Plan"]):
+                if node["Node Type"] != "Seq Scan":
+                    continue
+                table = node["Relation Name"]
+                size = rows.get(table, 0)
+                returned = node["Actual Rows"] * node["Actual Loops"]
+                failed = (
+                    size >= options["min_rows"]
+                    and returned < size * options["max_share"]
+                )
+                self.stdout.write(
+                    f"  Seq Scan {table}: {returned} из ~{size:.0f} строк"
+                    f"{' - ОШИБКА' if failed else ''}"
+                )
+                if failed:
+                    problems.append(f"{name}: Seq Scan {table}")
+
+        if problems:
+            raise CommandError(
+                "Последовательное чтение больших таблиц:\n" + "\n".join(problems)
+            )
+        self.stdout.write("Последовательных чтений больших таблиц нет")
@@ -0,0 +1,48 @@
+import sys
+import time
+
+from django.core.management import BaseCommand
+
+from catalog.export import EXPORT_CHUNK_SIZE, EXPORT_FORMATS, export_products
+from catalog.models import Product
+
+
+class Command(BaseCommand):
+    help = (
+        "Выгружает товары с категорией, активной версией и ценой в CSV или "
+        "JSONL, сжатый gzip. Строки читаются серверным курсором, поэтому "
+        "расход памяти не зависит от размера каталога"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--format", choices=EXPORT_FORMATS, default="csv")
+        parser.add_argument(
+            "--output", help="Файл выгрузки, по умолчанию products.<формат>.gz; - для stdout"
+        )
+        parser.add_argument(
+            "--chunk-size", type=int, default=EXPORT_CHUNK_SIZE, help="Строк в пачке"
+        )
+        parser.add_argument(
+            "--all", action="store_true", help="Выгрузить и неопубликованные товары"
+        )
+
+    def handle(self, *args, **options):
+        export_format = options["format"]
+        path = options["output"] or f"products.{export_format}.gz"
+        queryset = Product.objects.all() if options["all"] else None
+        chunks = export_products(export_format, queryset, options["chunk_size"])
+
+        started, size = time.perf_counter(), 0
+        if path == "-":
+            for chunk in chunks:
+                sys.stdout.buffer.write(chunk)
+                size += len(chunk)
+            sys.stdout.buffer.flush()
+            return
+        with open(path, "wb") as file:
+            for chunk in chunks:
+                file.write(chunk)
+                size += len(chunk)
+        self.stdout.write(
+            f"{path}: {size / 1024:.1f} КБ за {time.perf_counter() - started:.2f} с"
+        )
@@ -1,74 +1,158 @@
+import json
+import time
+from functools import partial
+from itertools import islice
+
 from django.core.management import BaseCommand
+from django.core.management.color import no_style
+from django.db import connection, transaction
+
 from catalog.models import Category, Product
-import json
+from catalog.services import (
+    invalidate_categories_cache,
+    invalidate_product_cache,
+    refresh_category_stats,
+)
 
 
 class Command(BaseCommand):
+    help = "Загружает категории и товары из фикстур JSON или JSONL"
+
+    chunk_size = 64 * 1024
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--categories", default="category.json", help="Файл с категориями"
+        )
+        parser.add_argument("--products", default="product.json", help="Файл с товарами")
+        parser.add_argument(
+            "--batch-size", type=int, default=1000, help="Записей в одном INSERT"
+        )
+
+    @classmethod
+    def json_read_records(cls, path):
+        # Читаем фикстуру по частям: JSON-массив или JSONL, по объекту на строку
+        with open(path, encoding="utf-8") as file:
+            buffer = file.read(cls.chunk_size).lstrip()
+            if not buffer.startswith("["):
+                file.seek(0)
+                for line in file:
+                    if line.strip():
+                        yield json.loads(line)
+                return
+
+            decoder = json.JSONDecoder()
+            position = 1
+            while True:
+                while position < len(buffer) and buffer[position] in " \t\r\n,":
+                    position += 1
+                if position < len(buffer) and buffer[position] == "]":
+                    return
+                try:
+                    record, position = decoder.raw_decode(buffer, position)
+                except ValueError:
+                    chunk = file.read(cls.chunk_size)
+                    if not chunk:
+                        raise
+                    buffer = buffer[position:] + chunk
+                    position = 0
+                    continue
+                yield record
 
     @staticmethod
-    def json_read_categories():
-    # Получаем данные из фикстуры с категориями
-        with open('category.json', encoding='utf-8') as file:
-            return json.load(file)
+    def get_fields(record):
+        # Поддерживаем формат dumpdata ("pk" + "fields") и плоские объекты
+        fields = dict(record.get("fields", record))
+        fields["id"] = record.get("pk", record.get("id"))
+        return fields
 
     @staticmethod
-    def json_read_products():
-    # Получаем данные из фикстуры с продуктами
-        with open('product.json', encoding='utf-8') as file:
-            return json.load(file)
+    def batches(records, size):
+        records = iter(records)
+        while batch := list(islice(records, size)):
+            yield batch
 
-    def handle(self, *args, **options):
+    def load(self, model, records, batch_size, update_fields):
+        # Вставляем записи пачками; существующие записи обновляются
+        started, total = time.perf_counter(), 0
+        for batch in self.batches(records, batch_size):
+            model.objects.bulk_create(
+                batch,
+                update_conflicts=True,
+                unique_fields=["id"],
+                update_fields=update_fields,
+            )
+            total += len(batch)
+            yield batch
+        elapsed = time.perf_counter() - started
+        self.stdout.write(
+            f"{model._meta.verbose_name_plural}: {total} за {elapsed:.2f} с "
+            f"({total / elapsed if elapsed else total:.0f} записей/с)"
+        )
 
-        Category.objects.all().delete() # Удаляем все категории
-        Product.objects.all().delete() # Удаляем все продукты
-
-        # Создаем списки для хранения объектов
-        category_list = []
-        # Обходим все значения категорий из фикстуры для получения информации об одном объекте
-        for category in Command.json_read_categories():
-            category_list.append(
-                {
-                    "id": category['pk'],
-                    "name": category['fields']['name'],
-                    "description": category['fields']['description']
-                }
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        with transaction.atomic():
+            categories = (
+                Category(
+                    id=fields["id"],
+                    name=fields["name"],
+                    description=fields.get("description"),
+                )
+                for fields in map(
+                    self.get_fields, self.json_read_records(options["categories"])
                 )
-
-        category_for_create = []
-        for category_item in category_list:
-            category_for_create.append(
-                Category(**category_item)
             )
+            for _ in self.load(Category, categories, batch_size, ["name", "description"]):
+                pass
 
-        # Создаем объекты в базе с помощью метода bulk_create()
-        Category.objects.bulk_create(category_for_create)
-
-        product_list = []
-        # Обходим все значения продуктов из фикстуры для получения информации об одном объекте
-        for product in Command.json_read_products():
-            product_list.append(
-                {
-                    "id": product['pk'],
-                    "name": product['fields']['name'],
-                    "description": product['fields']['description'],
-                    "photo": product['fields']['photo'],
-                    "category": Category.objects.get(pk=product['fields']['category']),
-                    "price": product['fields']['price'],
-                    "created_at": product['fields']['created_at'],
-                    "updated_at": product['fields']['updated_at']
-
-                }
-                )
+            # Внешние ключи проверяются по словарю id категорий, а не запросом на товар
+            category_ids = set(Category.objects.values_list("pk", flat=True))
+            missing = 0
 
-        product_for_create = []
-        for product_item in product_list:
-            product_for_create.append(
-                Product(**product_item)
-            )
+            def build_products():
+                nonlocal missing
+                for fields in map(
+                    self.get_fields, self.json_read_records(options["products"])
+                ):
+                    category_id = fields.get("category")
+                    if category_id is not None and category_id not in category_ids:
+                        missing += 1
+                        category_id = None
+                    yield Product(
+                        id=fields["id"],
+                        name=fields["name"],
+                        description=fields.get("description"),
+                        photo=fields.get("photo") or "",
+                        category_id=category_id,
+                        price=fields.get("price"),
+                        # В фикстурах до появления флага все товары были витринными
+                        is_published=fields.get("is_published", True),
+                    )
 
-        # Создаем объекты в базе с помощью метода bulk_create()
-        Product.objects.bulk_create(product_for_create)
+            update_fields = [
+                "name",
+                "description",
+                "photo",
+                "category",
+                "price",
+                "is_published",
+                "updated_at",
+            ]
+            for batch in self.load(Product, build_products(), batch_size, update_fields):
+                # Кэш сбрасывается после фиксации, иначе одновременное чтение
+                # успело бы вернуть в него прежнюю запись
+                products = [(product.pk, product.updated_at) for product in batch]
+                transaction.on_commit(partial(invalidate_product_cache, products))
 
-        # print(product_for_create)
-        # print(category_for_create)
+            # После вставки с явными id последовательности нужно сдвинуть
+            with connection.cursor() as cursor:
+                for sql in connection.ops.sequence_reset_sql(
+                    no_style(), [Category, Product]
+                ):
+                    cursor.execute(sql)
+            refresh_category_stats()
+            transaction.on_commit(invalidate_categories_cache)
 
+        if missing:
+            self.stdout.write(f"Товаров с неизвестной категорией: {missing}")
@@ -0,0 +1,20 @@
+from django.conf import settings
+from django.core.management import BaseCommand, CommandError
+
+from catalog.services import blog_views_counter
+
+
+class Command(BaseCommand):
+    help = "Записывает накопленные просмотры публикаций в БД"
+
+    def handle(self, *args, **options):
+        # Без общего кэша просмотры копятся в памяти каждого процесса
+        # приложения, и отдельный процесс команды их не видит
+        if not settings.CACHE_ENABLED:
+            raise CommandError(
+                "Просмотры хранятся в кэше процессов приложения: включите общий "
+                "кэш (CACHE_ENABLED=True), чтобы сбрасывать их командой"
+            )
+        # Вызывается при остановке приложения, чтобы не потерять просмотры
+        flushed = blog_views_counter.flush()
+        self.stdout.write(f"Записано просмотров: {flushed}")
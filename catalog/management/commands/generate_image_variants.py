@@ -0,0 +1,56 @@
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management import BaseCommand
+from django.db import connections
+
+from catalog.images import generate_variants
+from catalog.models import Blog, Product
+from users.models import User
+
+
+def generate(name, force):
+    try:
+        return name, generate_variants(name, force=force), None
+    except Exception as error:
+        return name, 0, str(error)
+
+
+class Command(BaseCommand):
+    help = "Создает уменьшенные варианты для уже загруженных изображений"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--workers", type=int, default=None, help="Количество процессов"
+        )
+        parser.add_argument(
+            "--force", action="store_true", help="Пересоздать существующие варианты"
+        )
+
+    @staticmethod
+    def get_image_names():
+        # Собираем имена файлов изображений из всех моделей без повторов
+        names = set()
+        for model, field in ((Product, "photo"), (Blog, "photo"), (User, "avatar")):
+            names.update(
+                model.objects.exclude(**{f"{field}__isnull": True})
+                .exclude(**{field: ""})
+                .values_list(field, flat=True)
+            )
+        return sorted(names)
+
+    def handle(self, *args, **options):
+        names = self.get_image_names()
+        # Соединения с БД не должны наследоваться дочерними процессами
+        connections.close_all()
+
+        created = 0
+        with ProcessPoolExecutor(max_workers=options["workers"]) as executor:
+            results = executor.map(
+                generate, names, [options["force"]] * len(names), chunksize=4
+            )
+            for name, written, error in results:
+                if error:
+                    self.stderr.write(f"{name}: {error}")
+                else:
+                    created += written
+        self.stdout.write(f"Обработано изображений: {len(names)}, создано файлов: {created}")
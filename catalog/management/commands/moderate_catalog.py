@@ -0,0 +1,36 @@
+from django.core.management import BaseCommand
+
+from catalog.models import Product
+from catalog.moderation import get_forbidden_word_matcher
+from catalog.services import set_published
+
+
+class Command(BaseCommand):
+    help = "Проверяет названия и описания товаров на запрещенные слова"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--unpublish",
+            action="store_true",
+            help="Снять с публикации товары с запрещенными словами",
+        )
+        parser.add_argument("--chunk-size", type=int, default=2000)
+
+    def handle(self, *args, **options):
+        matcher = get_forbidden_word_matcher()
+        flagged = []
+        products = Product.objects.only("pk", "name", "description").order_by("pk")
+        for product in products.iterator(chunk_size=options["chunk_size"]):
+            for field in ("name", "description"):
+                for match in matcher.find(getattr(product, field)):
+                    self.stdout.write(
+                        f'{product.pk}\t{field}\t{match.start}\t"{match.text}" ({match.word})'
+                    )
+                    flagged.append(product.pk)
+
+        flagged = sorted(set(flagged))
+        self.stdout.write(f"Товаров с запрещенными словами: {len(flagged)}")
+        if options["unpublish"] and flagged:
+            # set_published сбрасывает кэш товаров и пересчитывает статистику категорий
+            unpublished = set_published(Product.objects.filter(pk__in=flagged), False)
+            self.stdout.write(f"Снято с публикации: {unpublished}")
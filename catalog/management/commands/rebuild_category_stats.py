@@ -0,0 +1,19 @@
+import time
+
+from django.core.management import BaseCommand
+
+from catalog.services import refresh_category_stats
+
+
+class Command(BaseCommand):
+    help = (
+        "Пересчитывает статистику всех категорий (число опубликованных "
+        "товаров, минимальная и максимальная цена)"
+    )
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        count = refresh_category_stats()
+        self.stdout.write(
+            f"Категорий пересчитано: {count} за {time.perf_counter() - started:.2f} с"
+        )
@@ -0,0 +1,36 @@
+from django.core.management import BaseCommand
+
+from catalog.benchmarks import clear_benchmark_data, seed_benchmark_data
+
+
+class Command(BaseCommand):
+    help = "Заполняет БД синтетическим каталогом для команды benchmark"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--categories", type=int, default=200)
+        parser.add_argument("--products", type=int, default=50000)
+        parser.add_argument("--versions", type=int, default=3, help="Версий на товар")
+        parser.add_argument("--blogs", type=int, default=5000)
+        parser.add_argument("--users", type=int, default=1000)
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument(
+            "--keep", action="store_true", help="Не удалять данные прошлого заполнения"
+        )
+
+    def handle(self, *args, **options):
+        if not options["keep"]:
+            clear_benchmark_data()
+        seed_benchmark_data(
+            categories=options["categories"],
+            products=options["products"],
+            versions=options["versions"],
+            blogs=options["blogs"],
+            users=options["users"],
+            batch_size=options["batch_size"],
+            seed=options["seed"],
+        )
+        self.stdout.write(
+            f"Создано: категорий {options['categories']}, товаров {options['products']}, "
+            f"публикаций {options['blogs']}, пользователей {options['users']}"
+        )
@@ -0,0 +1,22 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0008_remove_blog_owner_product_owner'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='product',
+            options={'ordering': ('category', 'name'), 'permissions': [('can_edit_product_description', 'Can edit product description'), ('can_edit_product_category', 'Can edit product category'), ('can_cancel_publication', 'Can cancel publication of product')], 'verbose_name': 'товар', 'verbose_name_plural': 'товары'},
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='is_published',
+            field=models.BooleanField(default=False, help_text='Опубликовать запись', verbose_name='Опубликовано'),
+        ),
+    ]
@@ -0,0 +1,75 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:41
+
+import catalog.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("catalog", "0010_keyset_indexes"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="MediaBlob",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "digest",
+                    models.CharField(
+                        max_length=64, unique=True, verbose_name="SHA-256"
+                    ),
+                ),
+                ("name", models.CharField(max_length=255, verbose_name="Путь к файлу")),
+                ("size", models.PositiveBigIntegerField(verbose_name="Размер, байт")),
+                (
+                    "refcount",
+                    models.PositiveIntegerField(
+                        default=0, verbose_name="Количество ссылок"
+                    ),
+                ),
+                (
+                    "created_at",
+                    models.DateTimeField(
+                        auto_now_add=True, verbose_name="Дата создания"
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "файл",
+                "verbose_name_plural": "файлы",
+            },
+        ),
+        migrations.AlterField(
+            model_name="blog",
+            name="photo",
+            field=models.ImageField(
+                blank=True,
+                null=True,
+                storage=catalog.storage.get_media_storage,
+                upload_to="photo/",
+                verbose_name="Изображение (превью)",
+            ),
+        ),
+        migrations.AlterField(
+            model_name="product",
+            name="photo",
+            field=models.ImageField(
+                blank=True,
+                help_text="Загрузите изображение товара",
+                null=True,
+                storage=catalog.storage.get_media_storage,
+                upload_to="photo/",
+                verbose_name="Изображение (превью)",
+            ),
+        ),
+    ]
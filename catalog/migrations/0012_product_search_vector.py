@@ -0,0 +1,71 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:47
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.conf import settings
+from django.db import migrations
+
+# Вектор поиска: название (вес A), категория (B) и описание (C)
+PRODUCT_TRIGGER_SQL = """
+CREATE FUNCTION catalog_product_search_vector_update() RETURNS trigger AS $$
+BEGIN
+    NEW.search_vector :=
+        setweight(to_tsvector('russian', coalesce(NEW.name, '')), 'A') ||
+        setweight(to_tsvector('russian', coalesce(
+            (SELECT name FROM catalog_category WHERE id = NEW.category_id), ''
+        )), 'B') ||
+        setweight(to_tsvector('russian', coalesce(NEW.description, '')), 'C');
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER catalog_product_search_vector_trigger
+    BEFORE INSERT OR UPDATE OF name, description, category_id ON catalog_product
+    FOR EACH ROW EXECUTE FUNCTION catalog_product_search_vector_update();
+
+CREATE FUNCTION catalog_category_search_vector_update() RETURNS trigger AS $$
+BEGIN
+    UPDATE catalog_product SET name = name WHERE category_id = NEW.id;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER catalog_category_search_vector_trigger
+    AFTER UPDATE OF name ON catalog_category
+    FOR EACH ROW WHEN (OLD.name IS DISTINCT FROM NEW.name)
+    EXECUTE FUNCTION catalog_category_search_vector_update();
+
+UPDATE catalog_product SET name = name;
+"""
+
+DROP_TRIGGER_SQL = """
+DROP TRIGGER catalog_category_search_vector_trigger ON catalog_category;
+DROP FUNCTION catalog_category_search_vector_update();
+DROP TRIGGER catalog_product_search_vector_trigger ON catalog_product;
+DROP FUNCTION catalog_product_search_vector_update();
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("catalog", "0011_media_blob"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="product",
+            name="search_vector",
+            field=django.contrib.postgres.search.SearchVectorField(
+                editable=False, null=True
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="product",
+            index=django.contrib.postgres.indexes.GinIndex(
+                fields=["search_vector"], name="product_search_idx"
+            ),
+        ),
+        migrations.RunSQL(PRODUCT_TRIGGER_SQL, DROP_TRIGGER_SQL),
+    ]
@@ -0,0 +1,72 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:03
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def remove_orphans_and_duplicates(apps, schema_editor):
+    # Версии без товара удаляются, а из нескольких активных версий
+    # товара активной остается последняя добавленная
+    Version = apps.get_model("catalog", "Version")
+    Version.objects.filter(product__isnull=True).delete()
+    latest_active = (
+        Version.objects.filter(product=models.OuterRef("product"), is_version_active=True)
+        .order_by("-pk")
+        .values("pk")[:1]
+    )
+    Version.objects.filter(is_version_active=True).exclude(
+        pk=models.Subquery(latest_active)
+    ).update(is_version_active=False)
+
+
+def fill_active_version(apps, schema_editor):
+    Product = apps.get_model("catalog", "Product")
+    Version = apps.get_model("catalog", "Version")
+    active_version = Version.objects.filter(
+        product=models.OuterRef("pk"), is_version_active=True
+    ).values("pk")[:1]
+    Product.objects.update(active_version=models.Subquery(active_version))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("catalog", "0012_product_search_vector"),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_orphans_and_duplicates, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name="version",
+            name="product",
+            field=models.ForeignKey(
+                help_text="Выберите продукт",
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="versions",
+                to="catalog.product",
+                verbose_name="Продукт",
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="version",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(("is_version_active", True)),
+                fields=("product",),
+                name="version_one_active_per_product",
+            ),
+        ),
+        migrations.AddField(
+            model_name="product",
+            name="active_version",
+            field=models.ForeignKey(
+                blank=True,
+                editable=False,
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="+",
+                to="catalog.version",
+                verbose_name="Активная версия",
+            ),
+        ),
+        migrations.RunPython(fill_active_version, migrations.RunPython.noop),
+    ]
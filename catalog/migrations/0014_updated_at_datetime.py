@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:20
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("catalog", "0013_product_active_version"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="blog",
+            name="updated_at",
+            field=models.DateTimeField(
+                auto_now=True,
+                default=django.utils.timezone.now,
+                verbose_name="Дата обновления",
+            ),
+            preserve_default=False,
+        ),
+        migrations.AlterField(
+            model_name="product",
+            name="updated_at",
+            field=models.DateTimeField(auto_now=True, verbose_name="Дата обновления"),
+        ),
+    ]
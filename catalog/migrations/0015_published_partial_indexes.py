@@ -0,0 +1,74 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:08
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("catalog", "0014_updated_at_datetime"),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name="blog",
+            name="blog_keyset_idx",
+        ),
+        migrations.RemoveIndex(
+            model_name="product",
+            name="product_keyset_idx",
+        ),
+        # Индекс внешнего ключа заменяет составной version_product_active_idx.
+        # AlterField удалил бы заодно и частичный уникальный индекс
+        # version_one_active_per_product по тому же столбцу, поэтому
+        # удаляется только индекс внешнего ключа
+        migrations.SeparateDatabaseAndState(
+            database_operations=[
+                migrations.RunSQL(
+                    'DROP INDEX IF EXISTS "catalog_version_product_id_cc55142f"',
+                    reverse_sql=(
+                        'CREATE INDEX "catalog_version_product_id_cc55142f" '
+                        'ON "catalog_version" ("product_id")'
+                    ),
+                ),
+            ],
+            state_operations=[
+                migrations.AlterField(
+                    model_name="version",
+                    name="product",
+                    field=models.ForeignKey(
+                        db_index=False,
+                        help_text="Выберите продукт",
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="versions",
+                        to="catalog.product",
+                        verbose_name="Продукт",
+                    ),
+                ),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name="blog",
+            index=models.Index(
+                condition=models.Q(("is_published", True)),
+                fields=["title", "id"],
+                name="blog_published_keyset_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="product",
+            index=models.Index(
+                condition=models.Q(("is_published", True)),
+                fields=["category", "name", "id"],
+                name="product_published_keyset_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="version",
+            index=models.Index(
+                fields=["product", "is_version_active"],
+                name="version_product_active_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,80 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:14
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def fill_category_stats(apps, schema_editor):
+    Category = apps.get_model("catalog", "Category")
+    CategoryStats = apps.get_model("catalog", "CategoryStats")
+    Product = apps.get_model("catalog", "Product")
+    aggregates = {
+        row["category_id"]: row
+        for row in Product.objects.filter(is_published=True, category__isnull=False)
+        .values("category_id")
+        .annotate(
+            product_count=models.Count("pk"),
+            min_price=models.Min("price"),
+            max_price=models.Max("price"),
+        )
+        .order_by()
+    }
+    CategoryStats.objects.bulk_create(
+        (
+            CategoryStats(
+                category_id=pk,
+                product_count=aggregates.get(pk, {}).get("product_count", 0),
+                min_price=aggregates.get(pk, {}).get("min_price"),
+                max_price=aggregates.get(pk, {}).get("max_price"),
+            )
+            for pk in Category.objects.values_list("pk", flat=True).iterator()
+        ),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("catalog", "0015_published_partial_indexes"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="CategoryStats",
+            fields=[
+                (
+                    "category",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="stats",
+                        serialize=False,
+                        to="catalog.category",
+                        verbose_name="Категория",
+                    ),
+                ),
+                (
+                    "product_count",
+                    models.PositiveIntegerField(default=0, verbose_name="Товаров"),
+                ),
+                (
+                    "min_price",
+                    models.IntegerField(
+                        blank=True, null=True, verbose_name="Минимальная цена"
+                    ),
+                ),
+                (
+                    "max_price",
+                    models.IntegerField(
+                        blank=True, null=True, verbose_name="Максимальная цена"
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "статистика категории",
+                "verbose_name_plural": "статистика категорий",
+            },
+        ),
+        migrations.RunPython(fill_category_stats, migrations.RunPython.noop),
+    ]
@@ -1,5 +1,9 @@
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVectorField
 from django.db import models
+from django.db.models.functions import Left
 
+from catalog.storage import get_media_storage
 from users.models import User
 
 
@@ -27,6 +31,96 @@ class Category(models.Model):
         verbose_name_plural = "Категории"
 
 
+class CategoryStats(models.Model):
+    """
+    Число опубликованных товаров категории и диапазон их цен для навигации.
+    Обновляется сервисом update_category_stats при изменении товаров,
+    полностью пересчитывается сервисом refresh_category_stats
+    """
+    category = models.OneToOneField(
+        Category,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="stats",
+        verbose_name="Категория",
+    )
+    product_count = models.PositiveIntegerField(default=0, verbose_name="Товаров")
+    min_price = models.IntegerField(blank=True, null=True, verbose_name="Минимальная цена")
+    max_price = models.IntegerField(blank=True, null=True, verbose_name="Максимальная цена")
+
+    def __str__(self):
+        return f"{self.category_id}: {self.product_count}"
+
+    class Meta:
+        verbose_name = "статистика категории"
+        verbose_name_plural = "статистика категорий"
+
+
+# Поля карточки товара: updated_at входит в ключ кэша фрагмента,
+# category и owner нужны для сортировки и проверки прав
+PRODUCT_CARD_FIELDS = (
+    "name",
+    "photo",
+    "category",
+    "owner",
+    "updated_at",
+    "active_version__version_name",
+    "active_version__version_number",
+)
+
+
+class ProductQuerySet(models.QuerySet):
+    """
+    Набор запросов для товаров
+    """
+
+    def published(self):
+        """
+        Товары, опубликованные на витрине
+        """
+        return self.filter(is_published=True)
+
+    def with_listing_data(self):
+        """
+        Подгружает категорию и активную версию товара одним запросом
+        """
+        return self.select_related("category", "active_version")
+
+    def for_listing(self, teaser_length=100):
+        """
+        Только поля карточки товара. Описание загружается началом
+        teaser: на один символ длиннее teaser_length, чтобы truncatechars
+        в шаблоне дал тот же результат, что и на полном тексте
+        """
+        return (
+            self.select_related("active_version")
+            .only(*PRODUCT_CARD_FIELDS)
+            .annotate(teaser=Left("description", teaser_length + 1))
+        )
+
+    def refresh_active_versions(self):
+        """
+        Записывает в active_version активную версию каждого товара
+        одним UPDATE
+        """
+        active_version = Version.objects.filter(
+            product=models.OuterRef("pk"), is_version_active=True
+        ).values("pk")[:1]
+        return self.update(active_version=models.Subquery(active_version))
+
+    def search(self, text):
+        """
+        Полнотекстовый поиск по названию, категории и описанию
+        с учетом русской морфологии, результаты упорядочены по релевантности
+        """
+        query = SearchQuery(text, config="russian", search_type="websearch")
+        return (
+            self.filter(search_vector=query)
+            .annotate(rank=SearchRank(models.F("search_vector"), query))
+            .order_by("-rank", "pk")
+        )
+
+
 class Product(models.Model):
     """
     Модель товара
@@ -44,6 +138,7 @@ class Product(models.Model):
     )
     photo = models.ImageField(
         upload_to="photo/",
+        storage=get_media_storage,
         blank=True,
         null=True,
         verbose_name="Изображение (превью)",
@@ -72,12 +167,26 @@ class Product(models.Model):
         related_name="products",
     )
 
-    updated_at = models.DateField(auto_now=True, verbose_name='Дата обновления')
+    updated_at = models.DateTimeField(auto_now=True, verbose_name='Дата обновления')
+    active_version = models.ForeignKey(
+        "Version",
+        on_delete=models.SET_NULL,
+        related_name="+",
+        null=True,
+        blank=True,
+        editable=False,
+        verbose_name="Активная версия",
+    )
     is_published = models.BooleanField(
         default=False,
         verbose_name="Опубликовано",
         help_text="Опубликовать запись",
     )
+    # Заполняется триггером в БД из названия, категории и описания
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    objects = ProductQuerySet.as_manager()
+
     def __str__(self):
         return f"{self.name}"
 
@@ -89,6 +198,15 @@ class Product(models.Model):
             "category",
             "name",
         )
+        indexes = [
+            # Витрина показывает только опубликованные товары
+            models.Index(
+                fields=["category", "name", "id"],
+                condition=models.Q(is_published=True),
+                name="product_published_keyset_idx",
+            ),
+            GinIndex(fields=["search_vector"], name="product_search_idx"),
+        ]
         permissions = [
             ('can_edit_product_description', 'Can edit product description'),
             ('can_edit_product_category', 'Can edit product category'),
@@ -111,6 +229,26 @@ class Buyer(models.Model):
         verbose_name_plural = 'покупатели'
         ordering = ('name',)
 
+class BlogQuerySet(models.QuerySet):
+    """
+    Набор запросов для публикаций
+    """
+
+    def published(self):
+        """
+        Публикации, показываемые в списке
+        """
+        return self.filter(is_published=True)
+
+    def for_listing(self, teaser_length=50):
+        """
+        Только поля карточки публикации и начало текста teaser
+        """
+        return self.only("title", "is_published").annotate(
+            teaser=Left("description", teaser_length + 1)
+        )
+
+
 class Blog(models.Model):
     """
     Модель блога
@@ -133,13 +271,18 @@ class Blog(models.Model):
     )
     photo = models.ImageField(
         upload_to="photo/",
+        storage=get_media_storage,
         blank=True,
         null=True,
         verbose_name="Изображение (превью)",
     )
     created_at = models.DateField(auto_now_add=True, verbose_name='Дата создания')
+    updated_at = models.DateTimeField(auto_now=True, verbose_name='Дата обновления')
     is_published = models.BooleanField(default=True, verbose_name='Опубликовано')
     views_count = models.PositiveIntegerField(default=0, verbose_name='Просмотры')
+
+    objects = BlogQuerySet.as_manager()
+
     def __str__(self):
         return f"{self.title}"
 
@@ -149,20 +292,65 @@ class Blog(models.Model):
         ordering = (
             "title",
         )
+        indexes = [
+            models.Index(
+                fields=["title", "id"],
+                condition=models.Q(is_published=True),
+                name="blog_published_keyset_idx",
+            ),
+        ]
 
 class Version(models.Model):
     """
     Модель для версии продукта
     """
-    product = models.ForeignKey(Product, related_name="versions", on_delete=models.SET_NULL, null=True, blank=True, verbose_name="Продукт", help_text="Выберите продукт",)
+    # Поиск версий товара обслуживает составной индекс version_product_active_idx
+    product = models.ForeignKey(Product, related_name="versions", on_delete=models.CASCADE, db_index=False, verbose_name="Продукт", help_text="Выберите продукт",)
     version_number = models.CharField(max_length=10, verbose_name="Номер версии", help_text="Введите номер версии", null=True, blank=True,)
     version_name = models.CharField(max_length=100, verbose_name="Название версии", help_text="Введите название версии", null=True, blank=True,)
     is_version_active = models.BooleanField(default=False, verbose_name="Активная версия", help_text="является ли версия активной",)
 
     def __str__(self):
-        return f"{self.name_version}"
+        return f"{self.version_name} ({self.version_number})"
 
     class Meta:
         verbose_name = "Версия"
         verbose_name_plural = "Версии"
         ordering = ("version_number", "version_name",)
+        indexes = [
+            models.Index(
+                fields=["product", "is_version_active"],
+                name="version_product_active_idx",
+            ),
+        ]
+        constraints = [
+            # У товара может быть не больше одной активной версии
+            models.UniqueConstraint(
+                fields=["product"],
+                condition=models.Q(is_version_active=True),
+                name="version_one_active_per_product",
+            ),
+        ]
+
+
+class MediaBlob(models.Model):
+    """
+    Модель файла в хранилище с дедупликацией по содержимому
+    """
+    digest = models.CharField(max_length=64, unique=True, verbose_name="SHA-256")
+    name = models.CharField(max_length=255, verbose_name="Путь к файлу")
+    size = models.PositiveBigIntegerField(verbose_name="Размер, байт")
+    refcount = models.PositiveIntegerField(default=0, verbose_name="Количество ссылок")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Дата создания")
+
+    def __str__(self):
+        return self.name
+
+    class Meta:
+        verbose_name = "файл"
+        verbose_name_plural = "файлы"
+
+
+# Поля изображений в хранилище с дедупликацией: каждая ссылка на файл
+# учитывается в MediaBlob.refcount
+IMAGE_FIELDS = ((Product, "photo"), (Blog, "photo"), (User, "avatar"))
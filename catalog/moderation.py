@@ -0,0 +1,141 @@
+from collections import deque
+from functools import lru_cache
+from typing import NamedTuple
+
+from django.conf import settings
+
+DEFAULT_FORBIDDEN_WORDS = (
+    "казино",
+    "криптовалюта",
+    "крипта",
+    "биржа",
+    "дешево",
+    "бесплатно",
+    "обман",
+    "полиция",
+    "радар",
+)
+
+# Окончания, которые отбрасываются, чтобы находить слово в любой форме
+ENDING_LETTERS = "аеиоуыэюяйь"
+MIN_STEM_LENGTH = 4
+
+
+def normalize(text):
+    """
+    Приводит текст к нижнему регистру, сохраняя длину строки,
+    чтобы позиции совпадений указывали на исходный текст
+    """
+    chars = []
+    for char in text:
+        lower = char.lower()
+        chars.append(lower if len(lower) == 1 else char)
+    return "".join(chars).replace("ё", "е")
+
+
+def stem(word):
+    """
+    Грубая основа слова: без конечных гласных, й и ь
+    """
+    word = normalize(word.strip())
+    while len(word) > MIN_STEM_LENGTH and word[-1] in ENDING_LETTERS:
+        word = word[:-1]
+    return word
+
+
+class Match(NamedTuple):
+    word: str
+    start: int
+    end: int
+    text: str
+
+
+class ForbiddenWordMatcher:
+    """
+    Поиск запрещенных слов алгоритмом Ахо-Корасик.
+
+    Все основы слов собираются в один автомат, поэтому текст просматривается
+    за один проход независимо от количества слов. Совпадение засчитывается,
+    если основа стоит в начале слова; окончание может быть любым
+    """
+
+    def __init__(self, words):
+        self.words = []
+        self._goto = [{}]
+        self._fail = [0]
+        self._output = [[]]
+        for word in words:
+            if word.strip():
+                self._add(stem(word), word.strip())
+        self._build()
+
+    def _add(self, pattern, word):
+        state = 0
+        for char in pattern:
+            if char not in self._goto[state]:
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append([])
+                self._goto[state][char] = len(self._goto) - 1
+            state = self._goto[state][char]
+        if not self._output[state]:
+            self._output[state].append(len(self.words))
+            self.words.append((word, len(pattern)))
+
+    def _build(self):
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fail = self._fail[state]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[next_state] = self._goto[fail].get(char, 0)
+                self._output[next_state] = (
+                    self._output[next_state] + self._output[self._fail[next_state]]
+                )
+
+    def find(self, text):
+        """
+        Возвращает все найденные запрещенные слова с позициями в тексте
+        """
+        if not text:
+            return []
+        normalized = normalize(text)
+        matches = []
+        state = 0
+        for index, char in enumerate(normalized):
+            while state and char not in self._goto[state]:
+                state = self._fail[state]
+            state = self._goto[state].get(char, 0)
+            for pattern_index in self._output[state]:
+                word, length = self.words[pattern_index]
+                start = index - length + 1
+                if start > 0 and normalized[start - 1].isalnum():
+                    continue
+                end = index + 1
+                while end < len(normalized) and normalized[end].isalnum():
+                    end += 1
+                matches.append(Match(word, start, end, text[start:end]))
+        return matches
+
+
+def load_forbidden_words():
+    """
+    Список запрещенных слов из файла FORBIDDEN_WORDS_FILE (по слову на строку)
+    или список по умолчанию
+    """
+    path = settings.FORBIDDEN_WORDS_FILE
+    if not path:
+        return DEFAULT_FORBIDDEN_WORDS
+    with open(path, encoding="utf-8") as file:
+        return tuple(line.strip() for line in file if line.strip())
+
+
+@lru_cache(maxsize=None)
+def get_forbidden_word_matcher():
+    """
+    Автомат строится один раз на процесс
+    """
+    return ForbiddenWordMatcher(load_forbidden_words())
@@ -0,0 +1,219 @@
+import base64
+import binascii
+import json
+
+from django.core.exceptions import ValidationError
+from django.db.models import F, Q
+from django.http import Http404
+
+
+class KeysetPaginator:
+    """
+    Постраничный вывод по ключу (keyset/cursor pagination).
+
+    Страница выбирается условием WHERE по значениям ключа сортировки
+    последней показанной записи, поэтому любая страница стоит столько же,
+    сколько первая, в отличие от OFFSET. Ключ задается списком полей
+    в порядке сортировки; последним полем должен быть уникальный pk.
+    NULL-значения сортируются в конце, как в PostgreSQL по умолчанию.
+    """
+
+    def __init__(self, queryset, keys, per_page, nullable=()):
+        self.queryset = queryset
+        self.keys = tuple(keys)
+        self.per_page = per_page
+        self.nullable = frozenset(nullable)
+
+    @staticmethod
+    def encode_cursor(direction, values):
+        """
+        Кодирует курсор в непрозрачную строку для URL
+        """
+        raw = json.dumps([direction, values], separators=(",", ":"))
+        return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+    @staticmethod
+    def decode_cursor(cursor):
+        """
+        Декодирует курсор, полученный из URL
+        """
+        try:
+            raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+            direction, values = json.loads(raw)
+        except (binascii.Error, ValueError, TypeError):
+            raise Http404("Некорректный курсор")
+        if direction not in ("next", "prev") or not isinstance(values, list):
+            raise Http404("Некорректный курсор")
+        return direction, values
+
+    def _clean_values(self, values):
+        # Значения курсора приходят от клиента: приводим их к типам полей,
+        # чтобы подмененный курсор не приводил к ошибке в запросе
+        if len(values) != len(self.keys):
+            raise Http404("Некорректный курсор")
+        opts = self.queryset.model._meta
+        try:
+            return [
+                None
+                if value is None
+                else (opts.pk if key == "pk" else opts.get_field(key)).to_python(value)
+                for key, value in zip(self.keys, values)
+            ]
+        except (ValidationError, ValueError, TypeError):
+            raise Http404("Некорректный курсор")
+
+    def _after(self, key, value):
+        if value is None:
+            return None
+        condition = Q(**{f"{key}__gt": value})
+        if key in self.nullable:
+            condition |= Q(**{f"{key}__isnull": True})
+        return condition
+
+    def _before(self, key, value):
+        if value is None:
+            return Q(**{f"{key}__isnull": False})
+        return Q(**{f"{key}__lt": value})
+
+    def _equal(self, key, value):
+        if value is None:
+            return Q(**{f"{key}__isnull": True})
+        return Q(**{key: value})
+
+    def _seek(self, values, compare):
+        condition = None
+        for index, key in enumerate(self.keys):
+            step = compare(key, values[index])
+            if step is None:
+                continue
+            for prev_key, prev_value in zip(self.keys[:index], values[:index]):
+                step &= self._equal(prev_key, prev_value)
+            condition = step if condition is None else condition | step
+        return condition
+
+    def _ordering(self, reverse=False):
+        if reverse:
+            return [F(key).desc(nulls_first=True) for key in self.keys]
+        return [F(key).asc(nulls_last=True) for key in self.keys]
+
+    def _values(self, obj):
+        return [getattr(obj, key) for key in self.keys]
+
+    def _page_queryset(self, cursor):
+        direction, values = "next", None
+        if cursor:
+            direction, values = self.decode_cursor(cursor)
+            values = self._clean_values(values)
+
+        reverse = direction == "prev"
+        queryset = self.queryset.order_by(*self._ordering(reverse))
+        if values is not None:
+            compare = self._before if reverse else self._after
+            condition = self._seek(values, compare)
+            queryset = queryset.filter(condition) if condition else queryset.none()
+        return queryset[: self.per_page + 1], reverse, values is not None
+
+    def _make_page(self, object_list, reverse, has_cursor):
+        has_more = len(object_list) > self.per_page
+        object_list = object_list[: self.per_page]
+        if reverse:
+            object_list.reverse()
+
+        if reverse:
+            has_next, has_previous = has_cursor, has_more
+        else:
+            has_next, has_previous = has_more, has_cursor
+        return KeysetPage(
+            object_list,
+            next_cursor=(
+                self.encode_cursor("next", self._values(object_list[-1]))
+                if has_next and object_list
+                else None
+            ),
+            previous_cursor=(
+                self.encode_cursor("prev", self._values(object_list[0]))
+                if has_previous and object_list
+                else None
+            ),
+        )
+
+    def get_page(self, cursor=None):
+        """
+        Возвращает страницу записей и курсоры на соседние страницы
+        """
+        queryset, reverse, has_cursor = self._page_queryset(cursor)
+        return self._make_page(list(queryset), reverse, has_cursor)
+
+    async def aget_page(self, cursor=None):
+        """
+        Асинхронный вариант get_page
+        """
+        queryset, reverse, has_cursor = self._page_queryset(cursor)
+        object_list = [
+            obj async for obj in queryset.aiterator(chunk_size=self.per_page + 1)
+        ]
+        return self._make_page(object_list, reverse, has_cursor)
+
+
+class KeysetPage:
+    """
+    Страница, полученная через KeysetPaginator
+    """
+
+    def __init__(self, object_list, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+
+class KeysetPaginationMixin:
+    """
+    Миксин для ListView, заменяющий постраничный вывод через OFFSET
+    на постраничный вывод по ключу сортировки
+    """
+
+    paginate_by = 24
+    cursor_kwarg = "cursor"
+    keyset = ("pk",)
+    keyset_nullable = ()
+
+    def get_paginator(self, queryset, per_page, **kwargs):
+        return KeysetPaginator(
+            queryset, self.keyset, per_page, nullable=self.keyset_nullable
+        )
+
+    def paginate_queryset(self, queryset, page_size):
+        paginator = self.get_paginator(queryset, page_size)
+        page = paginator.get_page(self.request.GET.get(self.cursor_kwarg))
+        return paginator, page, page.object_list, page.has_other_pages()
+
+    async def apaginate_queryset(self, queryset, page_size):
+        paginator = self.get_paginator(queryset, page_size)
+        page = await paginator.aget_page(self.request.GET.get(self.cursor_kwarg))
+        return paginator, page, page.object_list, page.has_other_pages()
+
+    def get_cursor_url_prefix(self):
+        # Остальные параметры запроса (например, фильтр) сохраняются в ссылках
+        query = self.request.GET.copy()
+        query.pop(self.cursor_kwarg, None)
+        query_prefix = f"{query.urlencode()}&" if query else ""
+        return f"?{query_prefix}{self.cursor_kwarg}="
+
+    def get_context_data(self, **kwargs):
+        kwargs.setdefault("cursor_url_prefix", self.get_cursor_url_prefix())
+        return super().get_context_data(**kwargs)
@@ -0,0 +1,39 @@
+from django.contrib.auth.models import Permission
+from django.db.models import Q
+
+MODERATOR_PERMISSIONS = frozenset(
+    (
+        "catalog.can_edit_product_description",
+        "catalog.can_edit_product_category",
+        "catalog.can_cancel_publication",
+    )
+)
+
+
+def get_user_permissions(user):
+    """
+    Права пользователя и его групп одним запросом. Результат запоминается
+    на объекте пользователя, который живет в пределах одного запроса, и
+    заодно заполняет кэш ModelBackend, поэтому has_perm и perms в шаблонах
+    больше не обращаются к БД
+    """
+    if not user.is_active or user.is_anonymous:
+        return frozenset()
+    if not hasattr(user, "_perm_cache"):
+        permissions = (
+            Permission.objects.filter(Q(user=user) | Q(group__user=user))
+            .values_list("content_type__app_label", "codename")
+            .order_by()
+            .distinct()
+        )
+        user._perm_cache = {f"{app_label}.{codename}" for app_label, codename in permissions}
+    return frozenset(user._perm_cache)
+
+
+def can_moderate_product(user):
+    """
+    Может ли пользователь редактировать чужие товары как модератор
+    """
+    if user.is_active and user.is_superuser:
+        return True
+    return MODERATOR_PERMISSIONS <= get_user_permissions(user)
@@ -1,21 +1,496 @@
-from django.core.cache import cache
+import time
+from collections import OrderedDict
+from threading import Lock
 
-from catalog.models import Category
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.cache.backends.redis import RedisCache
+from django.core.cache.utils import make_template_fragment_key
+from django.db import transaction
+from django.db.models import Count, F, Max, Min, Q, Value
+from django.db.models.functions import Greatest, Least, Now
+
+from catalog.models import Blog, Category, CategoryStats, Product
 from config.settings import CACHE_ENABLED
 
 
-def get_categories_from_cache():
+class LocalLRUCache:
+    """
+    Кэш в памяти процесса с вытеснением давно не использованных записей
+    и ограниченным временем жизни. Стоит перед общим кэшем Django, чтобы
+    частые чтения не выходили за пределы процесса
+    """
+
+    def __init__(self, max_size=128):
+        self.max_size = max_size
+        self._data = OrderedDict()
+        self._lock = Lock()
+
+    def get(self, key, ttl):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            value, stored_at = entry
+            if time.monotonic() - stored_at > ttl:
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (value, time.monotonic())
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+local_cache = LocalLRUCache()
+
+CATEGORIES_GENERATION_KEY = "categories:generation"
+
+# Общий кэш заполняется только с основной БД: после сброса кэша реплика
+# может еще отставать, и устаревшие данные остались бы в кэше до истечения
+# срока, а ETag страницы товара строится по updated_at из кэша
+PRIMARY_DB = "default"
+
+
+def get_categories_generation():
+    """
+    Возвращает текущее поколение кэша категорий
     """
-    Получаем категории из кэша. Если кэш пуст, то получает данные из БД
+    cache.add(CATEGORIES_GENERATION_KEY, 1, timeout=None)
+    return cache.get(CATEGORIES_GENERATION_KEY, 1)
+
+
+def invalidate_categories_cache():
     """
+    Сбрасывает кэш категорий, увеличивая номер поколения.
+    Записи прошлых поколений больше не читаются и вытесняются сами
+    """
+    cache.add(CATEGORIES_GENERATION_KEY, 0, timeout=None)
+    cache.incr(CATEGORIES_GENERATION_KEY)
+    local_cache.clear()
+
+
+def _get_cached_categories(name, queryset):
+    # Общая схема кэша списков категорий: кэш процесса, общий кэш, БД
     if not CACHE_ENABLED:
-        return Category.objects.all()
-    key = "categories_list"
+        return tuple(queryset)
+
+    categories = local_cache.get(name, settings.LOCAL_CACHE_TTL)
+    if categories is not None:
+        return categories
+
+    key = f"{name}_list:{get_categories_generation()}"
     categories = cache.get(key)
+    if categories is None:
+        categories = tuple(queryset.using(PRIMARY_DB))
+        cache.set(key, categories)
+    local_cache.set(name, categories)
+    return categories
+
+
+async def _aget_cached_categories(name, queryset):
+    if not CACHE_ENABLED:
+        return tuple([category async for category in queryset])
+
+    categories = local_cache.get(name, settings.LOCAL_CACHE_TTL)
     if categories is not None:
         return categories
-    categories = Category.objects.all()
-    cache.set(key, categories)
+
+    await cache.aadd(CATEGORIES_GENERATION_KEY, 1, timeout=None)
+    generation = await cache.aget(CATEGORIES_GENERATION_KEY, 1)
+    key = f"{name}_list:{generation}"
+    categories = await cache.aget(key)
+    if categories is None:
+        categories = tuple([category async for category in queryset.using(PRIMARY_DB)])
+        await cache.aset(key, categories)
+    local_cache.set(name, categories)
     return categories
 
 
+def get_categories_from_cache():
+    """
+    Получаем категории из кэша в виде кортежей (pk, name).
+    Сначала проверяется кэш процесса, затем общий кэш, затем БД
+    """
+    return _get_cached_categories(
+        "categories", Category.objects.order_by("name").values_list("pk", "name")
+    )
+
+
+async def aget_categories_from_cache():
+    """
+    Асинхронный вариант get_categories_from_cache для асинхронных представлений
+    """
+    return await _aget_cached_categories(
+        "categories", Category.objects.order_by("name").values_list("pk", "name")
+    )
+
+
+def category_navigation_queryset():
+    """
+    Категории с опубликованными товарами: (pk, name, число товаров,
+    минимальная и максимальная цена). Читает только CategoryStats
+    и категории, без обращения к таблице товаров
+    """
+    return (
+        Category.objects.filter(stats__product_count__gt=0)
+        .order_by("name")
+        .values_list(
+            "pk",
+            "name",
+            "stats__product_count",
+            "stats__min_price",
+            "stats__max_price",
+        )
+    )
+
+
+def get_category_navigation():
+    """
+    Навигация по категориям из кэша, сбрасывается вместе с кэшем категорий
+    """
+    return _get_cached_categories("category_navigation", category_navigation_queryset())
+
+
+async def aget_category_navigation():
+    """
+    Асинхронный вариант get_category_navigation
+    """
+    return await _aget_cached_categories(
+        "category_navigation", category_navigation_queryset()
+    )
+
+
+def refresh_category_stats(category_ids=None):
+    """
+    Пересчитывает CategoryStats указанных категорий, а без аргумента всех.
+    Строки категорий блокируются, поэтому одновременные пересчеты одной
+    категории выполняются по очереди и не записывают устаревшие данные.
+    Возвращает количество пересчитанных категорий
+    """
+    with transaction.atomic():
+        # FOR NO KEY UPDATE не мешает вставке товаров в эти категории
+        categories = Category.objects.select_for_update(no_key=True).order_by("pk")
+        products = Product.objects.published()
+        if category_ids is not None:
+            categories = categories.filter(pk__in=category_ids)
+            products = products.filter(category_id__in=category_ids)
+        pks = list(categories.values_list("pk", flat=True))
+        if not pks:
+            return 0
+
+        aggregates = {
+            row["category_id"]: row
+            for row in products.filter(category__isnull=False)
+            .values("category_id")
+            .annotate(
+                product_count=Count("pk"), min_price=Min("price"), max_price=Max("price")
+            )
+            .order_by()
+        }
+        CategoryStats.objects.bulk_create(
+            [
+                CategoryStats(
+                    category_id=pk,
+                    product_count=aggregates.get(pk, {}).get("product_count", 0),
+                    min_price=aggregates.get(pk, {}).get("min_price"),
+                    max_price=aggregates.get(pk, {}).get("max_price"),
+                )
+                for pk in pks
+            ],
+            update_conflicts=True,
+            unique_fields=["category"],
+            update_fields=["product_count", "min_price", "max_price"],
+            batch_size=1000,
+        )
+        transaction.on_commit(invalidate_categories_cache)
+    return len(pks)
+
+
+def _group_by_category(products):
+    # {category_id: (количество товаров, множество их цен)}
+    groups = {}
+    for category_id, price in products:
+        if category_id is None:
+            continue
+        count, prices = groups.get(category_id, (0, set()))
+        if price is not None:
+            prices.add(price)
+        groups[category_id] = (count + 1, prices)
+    return groups
+
+
+def update_category_stats(removed=(), added=()):
+    """
+    Обновляет CategoryStats по изменившимся опубликованным товарам без
+    пересчета категорий. removed и added - пары (category_id, price)
+    товаров, вышедших из статистики и вошедших в нее; вызывается после
+    записи товаров. Количество меняется через F(), диапазон цен
+    расширяется через Least/Greatest. Категория пересчитывается целиком,
+    только если из нее ушла граничная цена или у нее еще нет статистики
+    """
+    rescan = set()
+    with transaction.atomic():
+        for category_id, (count, prices) in _group_by_category(removed).items():
+            stats = CategoryStats.objects.filter(category_id=category_id)
+            if prices:
+                # Новую границу диапазона можно узнать только пересчетом
+                stats = stats.exclude(
+                    Q(min_price__in=prices) | Q(max_price__in=prices)
+                )
+            if not stats.update(product_count=F("product_count") - count):
+                rescan.add(category_id)
+        for category_id, (count, prices) in _group_by_category(added).items():
+            if category_id in rescan:
+                continue
+            changes = {"product_count": F("product_count") + count}
+            if prices:
+                changes["min_price"] = Least("min_price", Value(min(prices)))
+                changes["max_price"] = Greatest("max_price", Value(max(prices)))
+            if not CategoryStats.objects.filter(category_id=category_id).update(
+                **changes
+            ):
+                rescan.add(category_id)
+        if rescan:
+            refresh_category_stats(rescan)
+        else:
+            transaction.on_commit(invalidate_categories_cache)
+
+
+# Фрагменты шаблонов с данными товара, ключи которых зависят от pk и updated_at
+PRODUCT_FRAGMENTS = ("product_card", "product_detail")
+
+
+def get_product_cache_key(pk):
+    return f"product:{pk}"
+
+
+def get_product_from_cache(pk):
+    """
+    Получаем товар с категорией из кэша. Если кэш пуст, то получает данные из БД
+    """
+    queryset = Product.objects.select_related("category").filter(pk=pk)
+    if not CACHE_ENABLED:
+        return queryset.first()
+    key = get_product_cache_key(pk)
+    product = cache.get(key)
+    if product is None:
+        product = queryset.using(PRIMARY_DB).first()
+        if product is not None:
+            cache.set(key, product, settings.FRAGMENT_CACHE_TIMEOUT)
+    return product
+
+
+async def aget_product_from_cache(pk):
+    """
+    Асинхронный вариант get_product_from_cache
+    """
+    queryset = Product.objects.select_related("category").filter(pk=pk)
+    if not CACHE_ENABLED:
+        return await queryset.afirst()
+    key = get_product_cache_key(pk)
+    product = await cache.aget(key)
+    if product is None:
+        product = await queryset.using(PRIMARY_DB).afirst()
+        if product is not None:
+            await cache.aset(key, product, settings.FRAGMENT_CACHE_TIMEOUT)
+    return product
+
+
+def invalidate_product_cache(products):
+    """
+    Удаляет из кэша объекты товаров и фрагменты шаблонов с ними.
+    Принимает пары (pk, updated_at)
+    """
+    keys = []
+    for pk, updated_at in products:
+        keys.append(get_product_cache_key(pk))
+        keys.extend(
+            make_template_fragment_key(fragment, [pk, updated_at])
+            for fragment in PRODUCT_FRAGMENTS
+        )
+    if keys:
+        cache.delete_many(keys)
+
+
+def set_published(queryset, published):
+    """
+    Публикует или снимает с публикации записи одним UPDATE, одним
+    проходом сбрасывает кэш затронутых товаров и обновляет статистику
+    их категорий. Возвращает количество измененных записей
+    """
+    queryset = queryset.exclude(is_published=published)
+    with transaction.atomic():
+        if queryset.model is not Product:
+            return queryset.update(is_published=published, updated_at=Now())
+
+        # Старые updated_at нужны, чтобы найти ключи фрагментов в кэше
+        rows = list(
+            queryset.select_for_update().values_list(
+                "pk", "updated_at", "category_id", "price"
+            )
+        )
+        products = [(pk, updated_at) for pk, updated_at, _, _ in rows]
+        transaction.on_commit(lambda: invalidate_product_cache(products))
+        updated = Product.objects.filter(pk__in=[pk for pk, _ in products]).update(
+            is_published=published, updated_at=Now()
+        )
+        changed = [(category_id, price) for _, _, category_id, price in rows]
+        if published:
+            update_category_stats(added=changed)
+        else:
+            update_category_stats(removed=changed)
+        return updated
+
+
+class BlogViewsCounter:
+    """
+    Буфер просмотров публикаций с отложенной записью в БД.
+
+    Просмотры накапливаются атомарными счетчиками в кэше, а затем раз в
+    BLOG_VIEWS_FLUSH_INTERVAL секунд сбрасываются в БД пакетными UPDATE
+    с F()-выражением. Публикации с непустым счетчиком попадают в одно
+    множество в кэше: в Redis оно изменяется атомарными SADD и SMEMBERS
+    + DEL, в кэше процесса - под блокировкой, поэтому сброс видит все
+    публикации, ожидающие записи, и не зависит от вытеснения отдельных
+    записей журнала.
+    """
+
+    prefix = "blog_views"
+
+    def __init__(self):
+        self._lock = Lock()
+
+    @property
+    def _dirty_key(self):
+        return f"{self.prefix}:dirty"
+
+    def _counter_key(self, pk):
+        return f"{self.prefix}:{pk}"
+
+    def _redis(self):
+        # Клиент Redis, если общий кэш на нем; иначе None
+        backend = caches["default"]
+        if not isinstance(backend, RedisCache):
+            return None, None
+        key = backend.make_and_validate_key(self._dirty_key)
+        return backend._cache.get_client(key, write=True), key
+
+    def _mark_dirty(self, *pks):
+        client, key = self._redis()
+        if client is not None:
+            client.sadd(key, *pks)
+            return
+        with self._lock:
+            dirty = cache.get(self._dirty_key, set())
+            dirty.update(pks)
+            cache.set(self._dirty_key, dirty, timeout=None)
+
+    def _take_dirty(self):
+        client, key = self._redis()
+        if client is not None:
+            pipeline = client.pipeline(transaction=True)
+            pipeline.smembers(key)
+            pipeline.delete(key)
+            members, _ = pipeline.execute()
+            return {int(pk) for pk in members}
+        with self._lock:
+            dirty = cache.get(self._dirty_key, set())
+            cache.delete(self._dirty_key)
+            return dirty
+
+    def incr(self, pk):
+        """
+        Учитывает один просмотр публикации и возвращает число просмотров,
+        еще не записанных в БД, включая текущий
+        """
+        key = self._counter_key(pk)
+        cache.add(key, 0, timeout=None)
+        pending = cache.incr(key)
+        # Отметка на каждом просмотре: если множество было вытеснено,
+        # публикация вернется в него со следующим просмотром
+        self._mark_dirty(pk)
+        interval = settings.BLOG_VIEWS_FLUSH_INTERVAL
+        if cache.add(f"{self.prefix}:flush_timer", 1, timeout=interval):
+            self.flush()
+        return pending
+
+    async def aincr(self, pk):
+        """
+        Асинхронный вариант incr. Сброс в БД выполняется в потоке
+        """
+        key = self._counter_key(pk)
+        await cache.aadd(key, 0, timeout=None)
+        pending = await cache.aincr(key)
+        await sync_to_async(self._mark_dirty)(pk)
+        interval = settings.BLOG_VIEWS_FLUSH_INTERVAL
+        if await cache.aadd(f"{self.prefix}:flush_timer", 1, timeout=interval):
+            await sync_to_async(self.flush)()
+        return pending
+
+    def pending(self, pk):
+        """
+        Возвращает число просмотров, еще не записанных в БД
+        """
+        return cache.get(self._counter_key(pk), 0)
+
+    def flush(self):
+        """
+        Записывает накопленные просмотры в БД и возвращает их количество
+        """
+        lock_key = f"{self.prefix}:flush_lock"
+        if not cache.add(lock_key, 1, timeout=60):
+            return 0
+        try:
+            return self._flush()
+        finally:
+            cache.delete(lock_key)
+
+    def _flush(self):
+        pks = self._take_dirty()
+        if not pks:
+            return 0
+        try:
+            counters = cache.get_many([self._counter_key(pk) for pk in pks])
+            pks_by_delta = {}
+            for pk in pks:
+                delta = counters.get(self._counter_key(pk))
+                if delta:
+                    pks_by_delta.setdefault(delta, []).append(pk)
+
+            with transaction.atomic():
+                for delta, delta_pks in pks_by_delta.items():
+                    Blog.objects.filter(pk__in=delta_pks).update(
+                        views_count=F("views_count") + delta
+                    )
+        except BaseException:
+            # Публикации возвращаются в множество до следующего сброса
+            self._mark_dirty(*pks)
+            raise
+
+        # Просмотры, пришедшие во время сброса, остаются в счетчике
+        remaining = []
+        for delta, delta_pks in pks_by_delta.items():
+            for pk in delta_pks:
+                try:
+                    left = cache.decr(self._counter_key(pk), delta)
+                except ValueError:
+                    # Счетчик вытеснен после записи в БД: вычитать нечего
+                    continue
+                if left > 0:
+                    remaining.append(pk)
+        if remaining:
+            self._mark_dirty(*remaining)
+        return sum(delta * len(items) for delta, items in pks_by_delta.items())
+
+
+blog_views_counter = BlogViewsCounter()
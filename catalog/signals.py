@@ -0,0 +1,207 @@
+import logging
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from PIL import Image
+
+from catalog.images import generate_variants
+from catalog.models import IMAGE_FIELDS, Category, Product, Version
+from catalog.services import (
+    invalidate_categories_cache,
+    invalidate_product_cache,
+    refresh_category_stats,
+    update_category_stats,
+)
+from catalog.storage import media_storage
+
+logger = logging.getLogger(__name__)
+
+
+# Поля товара, от которых зависит статистика категории
+STATS_FIELDS = ("category_id", "price", "is_published")
+IMAGE_FIELD_NAMES = dict(IMAGE_FIELDS)
+
+
+def remember_previous_state(sender, instance, update_fields=None, **kwargs):
+    """
+    Одним запросом запоминает значения полей до сохранения: файл
+    изображения, чтобы освободить его при замене, а у товара еще
+    и поля статистики категории
+    """
+    fields = [IMAGE_FIELD_NAMES[sender]]
+    if sender is Product:
+        fields.extend(STATS_FIELDS)
+    image = getattr(instance, fields[0])
+    # Новый файл еще не записан: его имя станет известно после сохранения
+    instance._image_uploaded = bool(image) and not image._committed
+    instance._previous_state = None
+    if instance._state.adding:
+        return
+    if update_fields is not None and not {
+        sender._meta.get_field(field).name for field in fields
+    } & set(update_fields):
+        # Отслеживаемые поля не сохраняются: прежние значения равны текущим
+        instance._previous_state = {
+            field: getattr(instance, field) for field in fields
+        }
+        instance._previous_state[fields[0]] = image.name
+        return
+    instance._previous_state = (
+        sender.objects.filter(pk=instance.pk).values(*fields).first()
+    )
+
+
+def release_media(name):
+    """
+    Освобождает ссылку на файл хранилища после фиксации транзакции.
+    Файлы, еще не перенесенные командой dedup_media, не удаляются:
+    у них нет счетчика ссылок
+    """
+    if name and media_storage.is_blob(name):
+        transaction.on_commit(lambda: media_storage.delete(name))
+
+
+def release_replaced_image(sender, instance, **kwargs):
+    """
+    Освобождает прежний файл изображения, если его заменили или убрали.
+    Повторная загрузка того же содержимого добавила ссылку, поэтому
+    прежняя освобождается и в этом случае
+    """
+    previous = instance.__dict__.get("_previous_state")
+    if previous is None:
+        return
+    field = IMAGE_FIELD_NAMES[sender]
+    image = getattr(instance, field)
+    if instance._image_uploaded or previous[field] != image.name:
+        release_media(previous[field])
+
+
+def release_deleted_image(sender, instance, **kwargs):
+    """
+    Освобождает файл изображения удаленной записи
+    """
+    release_media(getattr(instance, IMAGE_FIELD_NAMES[sender]).name)
+
+
+def create_image_variants(sender, instance, **kwargs):
+    """
+    Создает уменьшенные варианты только что загруженного изображения.
+    Ошибка чтения файла не должна мешать сохранению записи: варианты
+    можно создать позже командой generate_image_variants
+    """
+    if not instance.__dict__.get("_image_uploaded"):
+        return
+    name = getattr(instance, IMAGE_FIELD_NAMES[sender]).name
+    try:
+        generate_variants(name)
+    except (OSError, ValueError, Image.DecompressionBombError):
+        logger.warning(
+            "Не удалось создать варианты изображения %s", name, exc_info=True
+        )
+
+
+for model, _ in IMAGE_FIELDS:
+    pre_save.connect(
+        remember_previous_state,
+        sender=model,
+        dispatch_uid=f"{model._meta.label_lower}_previous_state",
+    )
+    post_save.connect(
+        release_replaced_image,
+        sender=model,
+        dispatch_uid=f"{model._meta.label_lower}_release_replaced_image",
+    )
+    post_save.connect(
+        create_image_variants,
+        sender=model,
+        dispatch_uid=f"{model._meta.label_lower}_image_variants",
+    )
+    post_delete.connect(
+        release_deleted_image,
+        sender=model,
+        dispatch_uid=f"{model._meta.label_lower}_release_deleted_image",
+    )
+
+
+@receiver(post_save, sender=Category, dispatch_uid="category_cache_on_save")
+@receiver(post_delete, sender=Category, dispatch_uid="category_cache_on_delete")
+def reset_categories_cache(sender, **kwargs):
+    """
+    Сбрасывает кэш категорий после фиксации транзакции
+    """
+    transaction.on_commit(invalidate_categories_cache)
+
+
+@receiver(post_save, sender=Product, dispatch_uid="product_cache_on_save")
+@receiver(post_delete, sender=Product, dispatch_uid="product_cache_on_delete")
+def reset_product_cache(sender, instance, **kwargs):
+    """
+    Сбрасывает кэш товара после фиксации транзакции
+    """
+    products = [(instance.pk, instance.updated_at)]
+    transaction.on_commit(lambda: invalidate_product_cache(products))
+
+
+@receiver(post_save, sender=Version, dispatch_uid="version_product_cache_on_save")
+@receiver(post_delete, sender=Version, dispatch_uid="version_product_cache_on_delete")
+def reset_version_product_cache(sender, instance, **kwargs):
+    """
+    Обновляет активную версию товара и сбрасывает его кэш
+    при изменении его версий
+    """
+    queryset = Product.objects.filter(pk=instance.product_id)
+    queryset.refresh_active_versions()
+    products = list(queryset.values_list("pk", "updated_at"))
+    transaction.on_commit(lambda: invalidate_product_cache(products))
+
+
+@receiver(post_save, sender=Category, dispatch_uid="category_products_cache_on_save")
+def reset_category_products_cache(sender, instance, created, **kwargs):
+    """
+    Сбрасывает кэш товаров категории при ее изменении
+    """
+    if created:
+        return
+    products = list(instance.categories.values_list("pk", "updated_at"))
+    transaction.on_commit(lambda: invalidate_product_cache(products))
+
+
+@receiver(post_save, sender=Product, dispatch_uid="product_stats_on_save")
+def refresh_product_category_stats(sender, instance, **kwargs):
+    """
+    Обновляет статистику прежней и новой категории товара, если
+    изменились его категория, цена или публикация
+    """
+    previous = instance.__dict__.get("_previous_state")
+    current = {field: getattr(instance, field) for field in STATS_FIELDS}
+    if previous is not None:
+        previous = {field: previous[field] for field in STATS_FIELDS}
+    if previous == current:
+        return
+    # Неопубликованные товары в статистику не входят
+    removed, added = [], []
+    if previous is not None and previous["is_published"]:
+        removed.append((previous["category_id"], previous["price"]))
+    if current["is_published"]:
+        added.append((current["category_id"], current["price"]))
+    if removed or added:
+        update_category_stats(removed=removed, added=added)
+
+
+@receiver(post_delete, sender=Product, dispatch_uid="product_stats_on_delete")
+def refresh_deleted_product_category_stats(sender, instance, **kwargs):
+    """
+    Исключает удаленный товар из статистики его категории
+    """
+    if instance.is_published:
+        update_category_stats(removed=[(instance.category_id, instance.price)])
+
+
+@receiver(post_save, sender=Category, dispatch_uid="category_stats_on_create")
+def create_category_stats(sender, instance, created, **kwargs):
+    """
+    Создает пустую статистику новой категории
+    """
+    if created:
+        refresh_category_stats([instance.pk])
@@ -0,0 +1,114 @@
+import hashlib
+import os
+import posixpath
+import tempfile
+
+from django.apps import apps
+from django.core.files.storage import FileSystemStorage
+from django.db import transaction
+from django.db.models import F
+
+from catalog.images import variant_names
+
+BLOB_DIR = "blobs"
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    Файловое хранилище с дедупликацией по содержимому.
+
+    Загружаемый файл хешируется (SHA-256) по мере записи на диск и хранится
+    один раз под именем blobs/ab/cd/<хеш><расширение>. Повторная загрузка
+    того же содержимого не создает новый файл, а увеличивает счетчик ссылок
+    в модели MediaBlob. Имя файла зависит только от содержимого, поэтому
+    его можно отдавать с бессрочными заголовками кэширования.
+    """
+
+    chunk_size = 64 * 1024
+
+    @staticmethod
+    def is_blob(name):
+        return name.startswith(f"{BLOB_DIR}/")
+
+    @staticmethod
+    def blob_name(digest, extension):
+        return posixpath.join(BLOB_DIR, digest[:2], digest[2:4], digest + extension)
+
+    def get_available_name(self, name, max_length=None):
+        # Итоговое имя определяется содержимым файла в _save
+        return name
+
+    def _save(self, name, content):
+        extension = posixpath.splitext(name)[1].lower()
+        hasher = hashlib.sha256()
+        size = 0
+
+        tmp_dir = self.path(posixpath.join(BLOB_DIR, "tmp"))
+        os.makedirs(tmp_dir, exist_ok=True)
+        descriptor, tmp_path = tempfile.mkstemp(dir=tmp_dir)
+        try:
+            with os.fdopen(descriptor, "wb") as tmp_file:
+                if hasattr(content, "seek"):
+                    content.seek(0)
+                for chunk in content.chunks(self.chunk_size):
+                    hasher.update(chunk)
+                    tmp_file.write(chunk)
+                    size += len(chunk)
+
+            name = self.blob_name(hasher.hexdigest(), extension)
+            path = self.path(name)
+            if os.path.exists(path):
+                os.remove(tmp_path)
+            else:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                os.replace(tmp_path, path)
+                if self.file_permissions_mode is not None:
+                    os.chmod(path, self.file_permissions_mode)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+        self._add_reference(name, hasher.hexdigest(), size)
+        return name
+
+    @staticmethod
+    def _add_reference(name, digest, size):
+        MediaBlob = apps.get_model("catalog", "MediaBlob")
+        with transaction.atomic():
+            blob, _ = MediaBlob.objects.get_or_create(
+                digest=digest, defaults={"name": name, "size": size}
+            )
+            MediaBlob.objects.filter(pk=blob.pk).update(refcount=F("refcount") + 1)
+
+    def delete(self, name):
+        """
+        Уменьшает счетчик ссылок и удаляет файл вместе с его уменьшенными
+        вариантами, когда ссылок не осталось
+        """
+        if not self.is_blob(name):
+            return super().delete(name)
+
+        MediaBlob = apps.get_model("catalog", "MediaBlob")
+        with transaction.atomic():
+            blob = MediaBlob.objects.select_for_update().filter(name=name).first()
+            if blob is not None and blob.refcount > 1:
+                MediaBlob.objects.filter(pk=blob.pk).update(
+                    refcount=F("refcount") - 1
+                )
+                return
+            if blob is not None:
+                blob.delete()
+        super().delete(name)
+        for variant in variant_names(name):
+            super().delete(variant)
+
+
+media_storage = ContentAddressedStorage()
+
+
+def get_media_storage():
+    """
+    Хранилище для полей ImageField
+    """
+    return media_storage
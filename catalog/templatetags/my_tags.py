@@ -1,4 +1,8 @@
 from django import template
+from django.core.files.storage import default_storage
+from django.utils.html import format_html
+
+from catalog.images import DENSITIES, has_variants, variant_name
 
 
 register = template.Library()
@@ -7,4 +11,30 @@ def media_filter(path):
     if path:
         return f"/media/{path}"
 
-    return "#"
\ No newline at end of file
+    return "#"
+
+
+def _srcset(name, variant, extension):
+    return ", ".join(
+        f"{default_storage.url(variant_name(name, variant, density, extension))} {density}x"
+        for density in DENSITIES
+    )
+
+
+@register.simple_tag()
+def responsive_image(path, variant="card", alt=""):
+    """
+    Выводит изображение с srcset из заранее созданных вариантов.
+    Если варианты еще не созданы, выводит исходное изображение
+    """
+    name = str(path or "")
+    if not name or not has_variants(name):
+        return format_html('<img src="{}" alt="{}">', media_filter(name), alt)
+    return format_html(
+        '<picture><source type="image/webp" srcset="{}">'
+        '<img src="{}" srcset="{}" alt="{}" loading="lazy"></picture>',
+        _srcset(name, variant, "webp"),
+        default_storage.url(variant_name(name, variant, 1, "jpg")),
+        _srcset(name, variant, "jpg"),
+        alt,
+    )
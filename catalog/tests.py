@@ -1,3 +1,1249 @@
-from django.test import TestCase
+import csv
+import gzip
+import json
+import shutil
+import tempfile
+from io import BytesIO, StringIO
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth.models import Group, Permission
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import IntegrityError, connection, connections
+from django.db.models import F
+from django.http import Http404
+from django.contrib.auth.models import AnonymousUser
+from django.test import (
+    AsyncRequestFactory,
+    SimpleTestCase,
+    TestCase,
+    TransactionTestCase,
+    override_settings,
+)
+from django.urls import reverse
+from PIL import Image
+
+from catalog.benchmarks import get_routes, measure_client, seed_benchmark_data
+from catalog.export import aexport_products
+from catalog.forms import ProductForm
+from catalog.images import variant_name
+from catalog.moderation import ForbiddenWordMatcher
+from catalog.models import Blog, Category, CategoryStats, MediaBlob, Product, Version
+from catalog.pagination import KeysetPaginator
+from catalog.permissions import MODERATOR_PERMISSIONS, can_moderate_product
+from catalog.services import (
+    blog_views_counter,
+    get_categories_from_cache,
+    get_product_from_cache,
+    local_cache,
+    refresh_category_stats,
+    set_published,
+)
+from catalog.storage import media_storage
+from catalog.templatetags.my_tags import responsive_image
+from catalog.views import (
+    AsyncBlogDetailView,
+    AsyncProductDetailView,
+    AsyncProductListView,
+)
+from config.middleware import PerformanceMiddleware, ReplicaStickinessMiddleware
+from config.performance import RequestMetrics
+from config.routers import ReplicaRouter, replica_state
+from users.models import User
+
+
+class ProductListViewTestCase(TestCase):
+    """
+    Тесты страницы со списком товаров
+    """
+
+    def setUp(self):
+        self.owner = User.objects.create(email="owner@example.com")
+
+    def create_products(self, count):
+        for _ in range(count):
+            category = Category.objects.create(name="Категория")
+            product = Product.objects.create(
+                name="Товар",
+                category=category,
+                owner=self.owner,
+                price=100,
+                is_published=True,
+            )
+            Version.objects.create(
+                product=product,
+                version_number="1",
+                version_name="Первая",
+                is_version_active=True,
+            )
+            Version.objects.create(
+                product=product, version_number="0", version_name="Старая"
+            )
+
+    def test_query_count_does_not_grow_with_products(self):
+        self.create_products(2)
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse("catalog:product_list"))
+        self.assertContains(response, "Первая")
+        self.assertNotContains(response, "Старая")
+
+        self.create_products(10)
+        with self.assertNumQueries(2):
+            self.client.get(reverse("catalog:product_list"))
+
+    def test_unpublished_products_are_hidden(self):
+        self.create_products(1)
+        Product.objects.create(name="Черновик", owner=self.owner)
+        response = self.client.get(reverse("catalog:product_list"))
+        self.assertContains(response, "Товар")
+        self.assertNotContains(response, "Черновик")
+
+    def test_cards_load_only_teaser(self):
+        self.create_products(1)
+        Product.objects.update(description="Описание " * 20)
+        response = self.client.get(reverse("catalog:product_list"))
+        product = response.context["object_list"][0]
+        self.assertIn("description", product.get_deferred_fields())
+        self.assertEqual(len(product.teaser), 101)
+        self.assertContains(response, ("Описание " * 20)[:99] + "…")
+
+    def test_explain_views(self):
+        self.create_products(3)
+        out = StringIO()
+        call_command("explain_views", stdout=out)
+        self.assertIn("product_list:", out.getvalue())
+        self.assertIn("Последовательных чтений больших таблиц нет", out.getvalue())
+
+
+class ProductPermissionsTestCase(TestCase):
+    """
+    Тесты проверки прав на редактирование товаров
+    """
+
+    def setUp(self):
+        self.owner = User.objects.create(email="owner@example.com")
+        self.moderator = User.objects.create(email="moderator@example.com")
+        group = Group.objects.create(name="Модераторы")
+        group.permissions.set(
+            Permission.objects.filter(
+                content_type__app_label="catalog",
+                codename__in=[name.split(".")[1] for name in MODERATOR_PERMISSIONS],
+            )
+        )
+        self.moderator.groups.add(group)
+        self.product = Product.objects.create(
+            name="Товар", owner=self.owner, price=100, is_published=True
+        )
+
+    def test_group_permissions_are_loaded_once(self):
+        user = User.objects.get(pk=self.moderator.pk)
+        with self.assertNumQueries(1):
+            self.assertTrue(can_moderate_product(user))
+            self.assertTrue(user.has_perm("catalog.can_cancel_publication"))
+        self.assertFalse(can_moderate_product(User.objects.get(pk=self.owner.pk)))
+
+    def test_update_view_does_not_write_user(self):
+        self.client.force_login(self.moderator)
+        with self.assertNumQueries(7):
+            response = self.client.get(
+                reverse("catalog:product_update", args=[self.product.pk])
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn("name", response.context["form"].fields)
+
+    def test_update_view_denies_other_users(self):
+        self.client.force_login(User.objects.create(email="other@example.com"))
+        response = self.client.get(
+            reverse("catalog:product_update", args=[self.product.pk])
+        )
+        self.assertEqual(response.status_code, 403)
+
+    def test_list_checks_permissions_once(self):
+        for _ in range(5):
+            Product.objects.create(
+                name="Товар", owner=self.owner, price=100, is_published=True
+            )
+        self.client.force_login(self.moderator)
+        with self.assertNumQueries(5):
+            response = self.client.get(reverse("catalog:product_list"))
+        self.assertContains(response, "Редактировать", count=6)
+
+
+class ActiveVersionTestCase(TestCase):
+    """
+    Тесты указателя на активную версию товара
+    """
+
+    def setUp(self):
+        self.owner = User.objects.create(email="owner@example.com")
+        self.product = Product.objects.create(name="Товар", owner=self.owner, price=100)
+        self.first = Version.objects.create(
+            product=self.product,
+            version_number="1",
+            version_name="Первая",
+            is_version_active=True,
+        )
+        self.second = Version.objects.create(
+            product=self.product, version_number="2", version_name="Вторая"
+        )
+
+    def formset_data(self, active, delete=()):
+        data = {
+            "name": "Товар",
+            "price": 100,
+            "owner": self.owner.pk,
+            "versions-TOTAL_FORMS": 3,
+            "versions-INITIAL_FORMS": 2,
+            "versions-MIN_NUM_FORMS": 0,
+            "versions-MAX_NUM_FORMS": 1000,
+        }
+        for index, version in enumerate((self.first, self.second)):
+            data[f"versions-{index}-id"] = version.pk
+            data[f"versions-{index}-product"] = self.product.pk
+            data[f"versions-{index}-version_number"] = version.version_number
+            data[f"versions-{index}-version_name"] = version.version_name
+            if version in active:
+                data[f"versions-{index}-is_version_active"] = "on"
+            if version in delete:
+                data[f"versions-{index}-DELETE"] = "on"
+        return data
+
+    def test_pointer_follows_versions(self):
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.active_version, self.first)
+        self.assertEqual(str(self.first), "Первая (1)")
+
+        self.first.delete()
+        self.product.refresh_from_db()
+        self.assertIsNone(self.product.active_version)
+
+    def test_only_one_active_version(self):
+        with self.assertRaises(IntegrityError):
+            Version.objects.create(product=self.product, is_version_active=True)
+
+    def test_product_deletion_removes_versions(self):
+        self.product.delete()
+        self.assertFalse(Version.objects.exists())
+
+    def test_formset_switches_active_version(self):
+        self.client.force_login(self.owner)
+        url = reverse("catalog:product_update", args=[self.product.pk])
+        response = self.client.post(url, self.formset_data(active=[self.second]))
+        self.assertEqual(response.status_code, 302)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.active_version, self.second)
+        self.first.refresh_from_db()
+        self.assertFalse(self.first.is_version_active)
+
+        response = self.client.post(
+            url, self.formset_data(active=[self.first, self.second])
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "Активной может быть только одна версия")
+
+        response = self.client.post(
+            url, self.formset_data(active=[self.second], delete=[self.second])
+        )
+        self.product.refresh_from_db()
+        self.assertIsNone(self.product.active_version)
+
+
+class KeysetPaginationTestCase(TestCase):
+    """
+    Тесты постраничного вывода по ключу
+    """
+
+    def setUp(self):
+        first = Category.objects.create(name="Первая")
+        second = Category.objects.create(name="Вторая")
+        for category in (second, None, first):
+            for name in ("Б", "А", "А"):
+                Product.objects.create(name=name, category=category)
+        self.expected = list(
+            Product.objects.order_by(
+                F("category_id").asc(nulls_last=True), "name", "pk"
+            ).values_list("pk", flat=True)
+        )
+
+    def test_forward_and_backward_walk(self):
+        paginator = KeysetPaginator(
+            Product.objects.all(),
+            ("category_id", "name", "pk"),
+            per_page=2,
+            nullable=("category_id",),
+        )
+        pages, page = [], paginator.get_page()
+        while True:
+            pages.append([product.pk for product in page])
+            if not page.has_next():
+                break
+            page = paginator.get_page(page.next_cursor)
+        self.assertEqual(sum(pages, []), self.expected)
+
+        backward = []
+        while page.has_previous():
+            page = paginator.get_page(page.previous_cursor)
+            backward.insert(0, [product.pk for product in page])
+        self.assertEqual(backward, pages[:-1])
+
+    def test_invalid_cursor_returns_404(self):
+        response = self.client.get(
+            reverse("catalog:product_list"), {"cursor": "garbage"}
+        )
+        self.assertEqual(response.status_code, 404)
+        # Курсор правильной формы, но со значениями не тех типов
+        for url, values in (
+            (reverse("catalog:product_list"), ["x", "a", 1]),
+            (reverse("catalog:product_list"), [1, "a", {"pk": 1}]),
+            (reverse("catalog:blog"), ["a", "x"]),
+        ):
+            cursor = KeysetPaginator.encode_cursor("next", values)
+            with self.subTest(url=url, values=values):
+                response = self.client.get(url, {"cursor": cursor})
+                self.assertEqual(response.status_code, 404)
+        cursor = KeysetPaginator.encode_cursor("next", ["1", "А", "1"])
+        response = self.client.get(reverse("catalog:product_list"), {"cursor": cursor})
+        self.assertEqual(response.status_code, 200)
+
+
+class BlogViewsCounterTestCase(TestCase):
+    """
+    Тесты отложенного счетчика просмотров публикаций
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.blog = Blog.objects.create(title="Статья")
+        self.other = Blog.objects.create(title="Другая")
+
+    @override_settings(BLOG_VIEWS_FLUSH_INTERVAL=3600)
+    def test_views_are_buffered_and_flushed(self):
+        url = reverse("catalog:detail_blog", args=[self.blog.pk])
+        for expected in (1, 2, 3):
+            response = self.client.get(url)
+            self.assertEqual(response.context["object"].views_count, expected)
+        self.client.get(reverse("catalog:detail_blog", args=[self.other.pk]))
+
+        self.blog.refresh_from_db()
+        self.assertEqual(self.blog.views_count, 1)
+        self.assertEqual(blog_views_counter.pending(self.blog.pk), 2)
+
+        with self.assertRaises(CommandError):
+            call_command("flush_blog_views", stdout=StringIO())
+        with override_settings(CACHE_ENABLED=True):
+            call_command("flush_blog_views", stdout=StringIO())
+        self.blog.refresh_from_db()
+        self.other.refresh_from_db()
+        self.assertEqual(self.blog.views_count, 3)
+        self.assertEqual(self.other.views_count, 1)
+        self.assertEqual(blog_views_counter.pending(self.blog.pk), 0)
+
+        response = self.client.get(url)
+        self.assertEqual(response.context["object"].views_count, 4)
+        self.assertEqual(blog_views_counter.flush(), 1)
+
+    def test_flush_survives_evicted_entries(self):
+        cache.set(f"{blog_views_counter.prefix}:flush_timer", 1, timeout=None)
+        for _ in range(2):
+            blog_views_counter.incr(self.blog.pk)
+        blog_views_counter.incr(self.other.pk)
+        # Счетчик вытеснен из кэша: его просмотры потеряны, остальные записываются
+        cache.delete(blog_views_counter._counter_key(self.other.pk))
+        self.assertEqual(blog_views_counter.flush(), 2)
+        self.blog.refresh_from_db()
+        self.assertEqual(self.blog.views_count, 2)
+
+        # Множество вытеснено целиком: следующий просмотр возвращает в него
+        # публикацию вместе с накопленными просмотрами
+        blog_views_counter.incr(self.blog.pk)
+        cache.delete(blog_views_counter._dirty_key)
+        self.assertEqual(blog_views_counter.flush(), 0)
+        blog_views_counter.incr(self.blog.pk)
+        self.assertEqual(blog_views_counter.flush(), 2)
+        self.blog.refresh_from_db()
+        self.assertEqual(self.blog.views_count, 4)
+        self.assertEqual(blog_views_counter.pending(self.blog.pk), 0)
+
+    def test_counter_evicted_during_flush(self):
+        cache.set(f"{blog_views_counter.prefix}:flush_timer", 1, timeout=None)
+        blog_views_counter.incr(self.blog.pk)
+        key = blog_views_counter._counter_key(self.blog.pk)
+        get_many = cache.get_many
+
+        def get_many_and_evict(keys):
+            counters = get_many(keys)
+            cache.delete(key)
+            return counters
+
+        with mock.patch.object(cache, "get_many", get_many_and_evict):
+            self.assertEqual(blog_views_counter.flush(), 1)
+        # Просмотры записаны один раз и не попадают в следующий сброс
+        self.assertEqual(blog_views_counter.flush(), 0)
+        self.blog.refresh_from_db()
+        self.assertEqual(self.blog.views_count, 1)
+
+
+class ImageVariantsTestCase(TestCase):
+    """
+    Тесты создания уменьшенных вариантов изображений
+    """
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings_override = override_settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def test_variants_are_created_on_upload(self):
+        buffer = BytesIO()
+        Image.new("RGB", (2000, 1000), "red").save(buffer, "JPEG")
+        product = Product.objects.create(
+            name="Товар", photo=SimpleUploadedFile("big.jpg", buffer.getvalue())
+        )
+
+        card = variant_name(product.photo.name, "card", 2, "webp")
+        with default_storage.open(card) as file:
+            self.assertEqual(Image.open(file).size, (640, 320))
+
+        html = responsive_image(product.photo, "card", product.name)
+        self.assertIn('type="image/webp"', html)
+        self.assertIn(
+            default_storage.url(variant_name(product.photo.name, "card", 2, "jpg"))
+            + " 2x",
+            html,
+        )
+
+    def test_broken_image_does_not_break_save(self):
+        with self.assertLogs("catalog.signals", "WARNING"):
+            product = Product.objects.create(
+                name="Товар", photo=SimpleUploadedFile("broken.jpg", b"not an image")
+            )
+        # Файл не загружается заново, поэтому варианты не создаются
+        product.photo = "missing.jpg"
+        product.save()
+        product.name = "Новое название"
+        product.save()
+        self.assertFalse(default_storage.exists("missing.jpg"))
+
+
+class ContentAddressedStorageTestCase(TestCase):
+    """
+    Тесты хранилища с дедупликацией по содержимому
+    """
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings_override = override_settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def test_identical_uploads_share_one_blob(self):
+        first = media_storage.save("photo/a.jpg", ContentFile(b"same content"))
+        second = media_storage.save("photo/b.JPG", ContentFile(b"same content"))
+        other = media_storage.save("photo/c.jpg", ContentFile(b"other content"))
+
+        self.assertEqual(first, second)
+        self.assertNotEqual(first, other)
+        self.assertTrue(first.startswith("blobs/"))
+        self.assertEqual(MediaBlob.objects.get(name=first).refcount, 2)
+
+        media_storage.delete(first)
+        self.assertTrue(media_storage.exists(first))
+        media_storage.delete(first)
+        self.assertFalse(media_storage.exists(first))
+        self.assertFalse(MediaBlob.objects.filter(name=first).exists())
+
+    @staticmethod
+    def image(color):
+        buffer = BytesIO()
+        Image.new("RGB", (40, 20), color).save(buffer, "JPEG")
+        return SimpleUploadedFile("photo.jpg", buffer.getvalue())
+
+    def test_references_are_released_on_replace_and_delete(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            first = Product.objects.create(name="Первый", photo=self.image("red"))
+            second = Product.objects.create(name="Второй", photo=self.image("red"))
+        name = first.photo.name
+        self.assertEqual(second.photo.name, name)
+        self.assertEqual(MediaBlob.objects.get(name=name).refcount, 2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            first.photo = self.image("blue")
+            first.save()
+        self.assertEqual(MediaBlob.objects.get(name=name).refcount, 1)
+
+        card = variant_name(name, "card", 1, "webp")
+        self.assertTrue(default_storage.exists(card))
+        with self.captureOnCommitCallbacks(execute=True):
+            second.delete()
+        self.assertFalse(MediaBlob.objects.filter(name=name).exists())
+        self.assertFalse(media_storage.exists(name))
+        self.assertFalse(default_storage.exists(card))
+
+    def test_dedup_counts_every_referencing_row(self):
+        legacy = default_storage.save("photo/legacy.jpg", self.image("green"))
+        first = Product.objects.create(name="Первый")
+        second = Blog.objects.create(title="Статья")
+        Product.objects.filter(pk=first.pk).update(photo=legacy)
+        Blog.objects.filter(pk=second.pk).update(photo=legacy)
+
+        call_command("dedup_media", stdout=StringIO())
+        first.refresh_from_db()
+        self.assertTrue(media_storage.is_blob(first.photo.name))
+        self.assertEqual(MediaBlob.objects.get(name=first.photo.name).refcount, 2)
+
+
+@mock.patch("catalog.services.CACHE_ENABLED", True)
+class CategoriesCacheTestCase(TestCase):
+    """
+    Тесты кэша категорий
+    """
+
+    def setUp(self):
+        cache.clear()
+        local_cache.clear()
+        self.category = Category.objects.create(name="Телефоны")
+
+    def test_categories_are_cached_and_invalidated(self):
+        self.assertEqual(get_categories_from_cache(), ((self.category.pk, "Телефоны"),))
+        with self.assertNumQueries(0):
+            get_categories_from_cache()
+            form = ProductForm()
+            self.assertIn((self.category.pk, "Телефоны"), form.fields["category"].choices)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.category.name = "Смартфоны"
+            self.category.save()
+        self.assertEqual(get_categories_from_cache(), ((self.category.pk, "Смартфоны"),))
+
+    def test_footer_lists_categories(self):
+        empty = Category.objects.create(name="Пустая")
+        Product.objects.create(
+            name="Телефон", category=self.category, price=100, is_published=True
+        )
+        response = self.client.get(reverse("catalog:blog"))
+        self.assertContains(response, f"?category={self.category.pk}")
+        self.assertContains(response, "Телефоны (1)")
+        self.assertNotContains(response, f"?category={empty.pk}")
+
+
+class CategoryStatsTestCase(TestCase):
+    """
+    Тесты статистики категорий
+    """
+
+    def setUp(self):
+        self.phones = Category.objects.create(name="Телефоны")
+        self.laptops = Category.objects.create(name="Ноутбуки")
+
+    def assertStats(self, category, product_count, min_price, max_price):
+        stats = CategoryStats.objects.get(category=category)
+        self.assertEqual(
+            (stats.product_count, stats.min_price, stats.max_price),
+            (product_count, min_price, max_price),
+        )
+
+    def test_stats_follow_product_changes(self):
+        self.assertStats(self.phones, 0, None, None)
+        cheap = Product.objects.create(
+            name="Дешевый", category=self.phones, price=100, is_published=True
+        )
+        expensive = Product.objects.create(
+            name="Дорогой", category=self.phones, price=900, is_published=True
+        )
+        Product.objects.create(name="Черновик", category=self.phones, price=10)
+        self.assertStats(self.phones, 2, 100, 900)
+
+        expensive.price = 500
+        expensive.save()
+        self.assertStats(self.phones, 2, 100, 500)
+
+        expensive.category = self.laptops
+        expensive.save()
+        self.assertStats(self.phones, 1, 100, 100)
+        self.assertStats(self.laptops, 1, 500, 500)
+
+        cheap.delete()
+        self.assertStats(self.phones, 0, None, None)
+
+        set_published(Product.objects.filter(pk=expensive.pk), False)
+        self.assertStats(self.laptops, 0, None, None)
+
+    def test_only_boundary_changes_rescan_category(self):
+        products = [
+            Product.objects.create(
+                name=f"Телефон {price}",
+                category=self.phones,
+                price=price,
+                is_published=True,
+            )
+            for price in (100, 500, 900)
+        ]
+        draft = Product.objects.create(name="Черновик", category=self.phones, price=300)
+        with mock.patch(
+            "catalog.services.refresh_category_stats", wraps=refresh_category_stats
+        ) as refresh:
+            middle = products[1]
+            middle.price = 700
+            middle.save()
+            middle.price = 50
+            middle.save()
+            set_published(Product.objects.filter(pk=draft.pk), True)
+            self.assertStats(self.phones, 4, 50, 900)
+            self.assertEqual(refresh.call_count, 0)
+
+            # Ушла максимальная цена: категория пересчитывается
+            products[2].delete()
+            self.assertEqual(refresh.call_count, 1)
+            self.assertStats(self.phones, 3, 50, 300)
+
+    def test_unrelated_changes_skip_refresh(self):
+        product = Product.objects.create(
+            name="Телефон", category=self.phones, price=100, is_published=True
+        )
+        product.description = "Новое описание"
+        with self.assertNumQueries(2):
+            product.save()
+
+    def test_rebuild_command(self):
+        Product.objects.create(
+            name="Телефон", category=self.phones, price=100, is_published=True
+        )
+        CategoryStats.objects.all().delete()
+        call_command("rebuild_category_stats", stdout=StringIO())
+        self.assertStats(self.phones, 1, 100, 100)
+        self.assertStats(self.laptops, 0, None, None)
+
+
+@mock.patch("catalog.services.CACHE_ENABLED", True)
+@mock.patch("catalog.context_processors.CACHE_ENABLED", True)
+class ProductDetailCacheTestCase(TestCase):
+    """
+    Тесты кэширования страницы товара
+    """
+
+    def setUp(self):
+        cache.clear()
+        local_cache.clear()
+        self.product = Product.objects.create(name="Телефон", description="Старое")
+        self.url = reverse("catalog:product_detail", args=[self.product.pk])
+
+    def test_product_is_cached_and_invalidated_on_save(self):
+        self.assertContains(self.client.get(self.url), "Старое")
+        with self.assertNumQueries(0):
+            self.assertContains(self.client.get(self.url), "Старое")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.description = "Новое"
+            self.product.save()
+        self.assertContains(self.client.get(self.url), "Новое")
+
+    # Реплика не настроена: чтение с нее завершилось бы ошибкой
+    @override_settings(DATABASE_REPLICAS=["replica_missing"])
+    @mock.patch.object(ReplicaRouter, "db_for_read", return_value="replica_missing")
+    def test_cache_is_filled_from_primary(self, db_for_read):
+        self.assertEqual(get_product_from_cache(self.product.pk), self.product)
+        self.assertEqual(len(get_categories_from_cache()), 0)
+
+    def test_user_specific_parts_are_not_shared(self):
+        self.client.get(self.url)
+        user = User.objects.create(email="user@example.com")
+        self.client.force_login(user)
+        response = self.client.get(self.url)
+        self.assertContains(response, reverse("users:logout"))
+
+
+class ConditionalGetTestCase(TestCase):
+    """
+    Тесты условного GET для страниц товара и публикации
+    """
+
+    def test_product_not_modified(self):
+        product = Product.objects.create(name="Телефон", price=100)
+        url = reverse("catalog:product_detail", args=[product.pk])
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("Cookie", response["Vary"])
+        etag = response["ETag"]
+
+        with self.assertTemplateNotUsed("catalog/product_detail.html"):
+            response = self.client.get(url, headers={"if-none-match": etag})
+        self.assertEqual(response.status_code, 304)
+        response = self.client.get(
+            url, headers={"if-modified-since": response["Last-Modified"]}
+        )
+        self.assertEqual(response.status_code, 304)
+
+        product.save()
+        response = self.client.get(url, headers={"if-none-match": etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+
+    def test_etag_depends_on_user(self):
+        product = Product.objects.create(name="Телефон", price=100)
+        url = reverse("catalog:product_detail", args=[product.pk])
+        etag = self.client.get(url)["ETag"]
+        self.client.force_login(User.objects.create(email="user@example.com"))
+        response = self.client.get(url, headers={"if-none-match": etag})
+        self.assertEqual(response.status_code, 200)
+
+    def test_blog_not_modified_still_counts_view(self):
+        cache.clear()
+        # Сброс просмотров в БД меняет ETag, поэтому откладываем его
+        cache.set(f"{blog_views_counter.prefix}:flush_timer", 1, timeout=None)
+        blog = Blog.objects.create(title="Статья")
+        url = reverse("catalog:detail_blog", args=[blog.pk])
+        etag = self.client.get(url)["ETag"]
+        with self.assertNumQueries(1):
+            response = self.client.get(url, headers={"if-none-match": etag})
+        self.assertEqual(response.status_code, 304)
+        blog.refresh_from_db()
+        self.assertEqual(blog.views_count + blog_views_counter.pending(blog.pk), 2)
+        self.assertEqual(
+            self.client.get(reverse("catalog:detail_blog", args=[0])).status_code, 404
+        )
+
+    def test_blog_etag_changes_on_views_flush(self):
+        cache.clear()
+        # Сброс просмотров в БД меняет ETag, поэтому откладываем его
+        cache.set(f"{blog_views_counter.prefix}:flush_timer", 1, timeout=None)
+        blog = Blog.objects.create(title="Статья")
+        url = reverse("catalog:detail_blog", args=[blog.pk])
+        etag = self.client.get(url)["ETag"]
+        response = self.client.get(url, headers={"if-none-match": etag})
+        self.assertEqual(response.status_code, 304)
+        # Сброс не трогает updated_at, но меняет число просмотров в БД
+        blog_views_counter.flush()
+        response = self.client.get(url, headers={"if-none-match": etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+
+
+class PublishTestCase(TestCase):
+    """
+    Тесты публикации и снятия с публикации
+    """
+
+    def test_toggle_is_single_update(self):
+        blog = Blog.objects.create(title="Статья")
+        url = reverse("catalog:toggle_activity", args=[blog.pk])
+        with self.assertNumQueries(1):
+            self.client.get(url)
+        blog.refresh_from_db()
+        self.assertFalse(blog.is_published)
+        self.client.get(url)
+        blog.refresh_from_db()
+        self.assertTrue(blog.is_published)
+        response = self.client.get(reverse("catalog:toggle_activity", args=[0]))
+        self.assertEqual(response.status_code, 404)
+
+    def test_bulk_publish_products(self):
+        products = [
+            Product.objects.create(name=f"Товар {i}", price=100, is_published=True)
+            for i in range(3)
+        ]
+        url = reverse("catalog:bulk_publish", args=["product"])
+        data = {"action": "unpublish", "pk": [product.pk for product in products[:2]]}
+        user = User.objects.create(email="user@example.com")
+        self.client.force_login(user)
+        self.assertEqual(self.client.post(url, data).status_code, 403)
+
+        user.user_permissions.add(
+            Permission.objects.get(codename="can_cancel_publication")
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(url, data)
+        self.assertEqual(response.json(), {"updated": 2})
+        self.assertEqual(Product.objects.filter(is_published=False).count(), 2)
+        self.assertGreater(
+            Product.objects.get(pk=products[0].pk).updated_at, products[0].updated_at
+        )
+        # Повторный запрос ничего не меняет
+        self.assertEqual(self.client.post(url, data).json(), {"updated": 0})
+        self.assertEqual(
+            self.client.post(url, {"action": "drop", "pk": ["1"]}).status_code, 400
+        )
+
+    def test_admin_action(self):
+        admin_user = User.objects.create(
+            email="admin@example.com", is_staff=True, is_superuser=True
+        )
+        blogs = [Blog.objects.create(title=f"Статья {i}") for i in range(3)]
+        self.client.force_login(admin_user)
+        self.client.post(
+            reverse("admin:catalog_blog_changelist"),
+            {"action": "unpublish", "_selected_action": [blog.pk for blog in blogs]},
+        )
+        self.assertFalse(Blog.objects.filter(is_published=True).exists())
+
+
+class ExportTestCase(TestCase):
+    """
+    Тесты потоковой выгрузки каталога
+    """
+
+    def setUp(self):
+        category = Category.objects.create(name="Телефоны")
+        self.product = Product.objects.create(
+            name="Смартфон, новый", category=category, price=100, is_published=True
+        )
+        Version.objects.create(
+            product=self.product, version_name="Первая", is_version_active=True
+        )
+        Product.objects.create(name="Черновик", price=100)
+
+    def test_csv_endpoint_streams_gzip(self):
+        url = reverse("catalog:export", args=["csv"])
+        user = User.objects.create(email="partner@example.com")
+        self.client.force_login(user)
+        self.assertEqual(self.client.get(url).status_code, 403)
+
+        user.user_permissions.add(Permission.objects.get(codename="view_product"))
+        response = self.client.get(url)
+        self.assertTrue(response.streaming)
+        self.assertEqual(response["Content-Type"], "application/gzip")
+        rows = list(
+            csv.reader(
+                gzip.decompress(b"".join(response.streaming_content))
+                .decode()
+                .splitlines()
+            )
+        )
+        self.assertEqual(rows[0][:5], ["id", "name", "category", "price", "version_name"])
+        self.assertEqual(
+            rows[1][:5], [str(self.product.pk), "Смартфон, новый", "Телефоны", "100", "Первая"]
+        )
+        self.assertEqual(len(rows), 2)
+        self.assertEqual(
+            self.client.get(reverse("catalog:export", args=["xml"])).status_code, 404
+        )
+
+    async def test_async_jsonl_export(self):
+        chunks = [
+            chunk async for chunk in aexport_products("jsonl", chunk_size=1)
+        ]
+        lines = gzip.decompress(b"".join(chunks)).decode().splitlines()
+        self.assertEqual(json.loads(lines[0])["version_name"], "Первая")
+        self.assertEqual(len(lines), 1)
+
+    def test_command_exports_all_products(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = f"{directory}/products.jsonl.gz"
+        call_command(
+            "export_products", format="jsonl", output=path, all=True, stdout=StringIO()
+        )
+        with gzip.open(path, "rt", encoding="utf-8") as file:
+            names = [json.loads(line)["name"] for line in file]
+        self.assertEqual(names, ["Смартфон, новый", "Черновик"])
+
+
+class FillCommandTestCase(TestCase):
+    """
+    Тесты загрузки фикстур командой fill
+    """
+
+    def test_fill_is_idempotent(self):
+        for _ in range(2):
+            call_command("fill", stdout=StringIO())
+        self.assertEqual(Category.objects.count(), 3)
+        self.assertEqual(Product.objects.count(), 5)
+        self.assertEqual(Product.objects.get(pk=1).category_id, 1)
+        self.assertEqual(Product.objects.published().count(), 5)
+        # Последовательность id сдвинута за загруженные записи
+        self.assertGreater(Product.objects.create(name="Новый").pk, 5)
+
+    def test_product_cache_is_reset_after_commit(self):
+        with mock.patch(
+            "catalog.management.commands.fill.invalidate_product_cache"
+        ) as invalidate:
+            with self.captureOnCommitCallbacks() as callbacks:
+                call_command("fill", stdout=StringIO())
+                invalidate.assert_not_called()
+            for callback in callbacks:
+                callback()
+        invalidated = [
+            pk for call in invalidate.call_args_list for pk, _ in call.args[0]
+        ]
+        self.assertEqual(sorted(invalidated), [1, 2, 3, 4, 5])
+
+    def test_fill_reads_jsonl(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        categories = f"{directory}/categories.jsonl"
+        products = f"{directory}/products.jsonl"
+        with open(categories, "w", encoding="utf-8") as file:
+            file.write('{"id": 7, "name": "Планшеты"}\n')
+        with open(products, "w", encoding="utf-8") as file:
+            for pk in range(1, 6):
+                file.write(f'{{"id": {pk}, "name": "Планшет {pk}", "category": 7}}\n')
+            file.write('{"id": 6, "name": "Без категории", "category": 99}\n')
+            file.write('{"id": 8, "name": "Черновик", "is_published": false}\n')
+
+        call_command(
+            "fill",
+            categories=categories,
+            products=products,
+            batch_size=2,
+            stdout=StringIO(),
+        )
+        self.assertEqual(Product.objects.filter(category_id=7).count(), 5)
+        self.assertIsNone(Product.objects.get(pk=6).category_id)
+        self.assertFalse(Product.objects.get(pk=8).is_published)
+        self.assertEqual(Product.objects.published().count(), 6)
+
+
+class ProductSearchTestCase(TestCase):
+    """
+    Тесты полнотекстового поиска товаров
+    """
+
+    def setUp(self):
+        self.phones = Category.objects.create(name="Телефоны")
+        self.phone = Product.objects.create(
+            name="Смартфон",
+            description="Большой экран",
+            category=self.phones,
+            is_published=True,
+        )
+        self.laptop = Product.objects.create(
+            name="Ноутбук",
+            description="Для работы с телефонами рядом",
+            is_published=True,
+        )
+
+    def test_search_uses_stemming_and_ranking(self):
+        results = list(Product.objects.search("телефон"))
+        self.assertEqual(results, [self.phone, self.laptop])
+        self.assertEqual(list(Product.objects.search("экраны")), [self.phone])
+
+    def test_category_rename_updates_search_vector(self):
+        self.phones.name = "Гаджеты"
+        self.phones.save()
+        self.assertEqual(list(Product.objects.search("гаджет")), [self.phone])
+
+    def test_search_page(self):
+        response = self.client.get(reverse("catalog:product_search"), {"q": "смартфоны"})
+        self.assertContains(response, "Смартфон")
+        self.assertNotContains(response, "Ноутбук")
+
+
+class ForbiddenWordMatcherTestCase(TestCase):
+    """
+    Тесты поиска запрещенных слов
+    """
+
+    def test_matches_word_forms_with_positions(self):
+        matcher = ForbiddenWordMatcher(["казино", "радар", "обман"])
+        text = "Антирадар и Радары для КАЗИНО, без обмана"
+        self.assertEqual(
+            [(match.word, match.start, match.text) for match in matcher.find(text)],
+            [("радар", 12, "Радары"), ("казино", 23, "КАЗИНО"), ("обман", 35, "обмана")],
+        )
+        self.assertEqual(matcher.find(None), [])
+
+    def test_product_form_reports_every_word(self):
+        form = ProductForm(data={"name": "Бесплатно и дешево", "description": ""})
+        self.assertFalse(form.is_valid())
+        self.assertEqual(
+            form.errors["name"],
+            [
+                'Наименование не должно содержать слово "бесплатно"',
+                'Наименование не должно содержать слово "дешево"',
+            ],
+        )
+        self.assertNotIn("description", form.errors)
+
+    def test_moderate_catalog_unpublishes_products(self):
+        category = Category.objects.create(name="Телефоны")
+        bad = Product.objects.create(
+            name="Телефон",
+            description="Почти бесплатно",
+            category=category,
+            price=10,
+            is_published=True,
+        )
+        good = Product.objects.create(
+            name="Телефон", category=category, price=50, is_published=True
+        )
+        call_command("moderate_catalog", unpublish=True, stdout=StringIO())
+        bad.refresh_from_db()
+        good.refresh_from_db()
+        self.assertFalse(bad.is_published)
+        self.assertTrue(good.is_published)
+        self.assertGreater(bad.updated_at, good.updated_at)
+        stats = CategoryStats.objects.get(category=category)
+        self.assertEqual((stats.product_count, stats.min_price, stats.max_price), (1, 50, 50))
+
+
+class ReplicaRouterTestCase(SimpleTestCase):
+    """
+    Тесты маршрутизации чтения на реплики
+    """
+
+    def setUp(self):
+        self.router = ReplicaRouter()
+
+    def route_read(self, state):
+        token = replica_state.set(state)
+        try:
+            return self.router.db_for_read(Product)
+        finally:
+            replica_state.reset(token)
+
+    @override_settings(DATABASE_REPLICAS=["replica_1", "replica_2"])
+    def test_catalog_reads_go_to_replicas(self):
+        self.assertIn(
+            self.route_read({"primary": False, "wrote": False}),
+            ["replica_1", "replica_2"],
+        )
+        self.assertEqual(self.router.db_for_write(Product), "default")
+        self.assertIsNone(self.router.db_for_read(User))
+        self.assertFalse(self.router.allow_migrate("replica_1", "catalog"))
+
+    @override_settings(DATABASE_REPLICAS=["replica_1", "replica_2"])
+    def test_reads_outside_replica_requests_go_to_default(self):
+        # Команды и миграции: запрос не разрешил чтение с реплики
+        self.assertEqual(self.router.db_for_read(Product), "default")
+        self.assertEqual(self.route_read({"primary": True, "wrote": False}), "default")
+        with mock.patch.object(connections["default"], "in_atomic_block", True):
+            self.assertEqual(
+                self.route_read({"primary": False, "wrote": False}), "default"
+            )
+
+    @override_settings(DATABASE_REPLICAS=[])
+    def test_without_replicas_reads_go_to_default(self):
+        self.assertEqual(self.route_read({"primary": False, "wrote": False}), "default")
+
+
+class ReplicaStickinessTestCase(TestCase):
+    """
+    Тесты закрепления пользователя за основной БД после записи
+    """
+
+    # Реплика указывает на ту же БД, чтобы проверить закрепление запросов
+    @override_settings(DATABASE_REPLICAS=["default"])
+    def test_write_pins_user_to_primary(self):
+        response = self.client.get(reverse("catalog:product_list"))
+        self.assertNotIn(ReplicaStickinessMiddleware.cookie_name, response.cookies)
+
+        blog = Blog.objects.create(title="Статья")
+        response = self.client.get(reverse("catalog:toggle_activity", args=[blog.pk]))
+        self.assertIn(ReplicaStickinessMiddleware.cookie_name, response.cookies)
+
+        pinned = []
+        db_for_read = ReplicaRouter.db_for_read
+
+        def spy(router, model, **hints):
+            pinned.append(replica_state.get()["primary"])
+            return db_for_read(router, model, **hints)
+
+        with mock.patch.object(ReplicaRouter, "db_for_read", spy):
+            self.client.get(reverse("catalog:product_list"))
+        self.assertTrue(pinned)
+        self.assertTrue(all(pinned))
+
+
+@skipUnless(settings.DATABASE_REPLICAS, "реплики не настроены (DB_REPLICA_HOSTS)")
+class ReplicaReadTestCase(TransactionTestCase):
+    """
+    Тесты чтения с настроенных реплик. Реплики в тестах зеркалируют
+    default, поэтому данные должны быть зафиксированы
+    """
+
+    databases = "__all__"
+
+    def test_reads_use_replica_alias(self):
+        product = Product.objects.create(name="Телефон")
+        self.assertEqual(product._state.db, "default")
+        # Без состояния запроса чтение идет с основной БД
+        self.assertEqual(Product.objects.get(pk=product.pk)._state.db, "default")
+        token = replica_state.set({"primary": False, "wrote": False})
+        try:
+            product = Product.objects.get(pk=product.pk)
+        finally:
+            replica_state.reset(token)
+        self.assertIn(product._state.db, settings.DATABASE_REPLICAS)
+
+
+class PerformanceMiddlewareTestCase(TestCase):
+    """
+    Тесты замеров производительности запросов
+    """
+
+    def test_repeated_queries_are_detected(self):
+        products = [Product.objects.create(name=f"Товар {i}", price=100) for i in range(5)]
+        metrics = RequestMetrics()
+        with connection.execute_wrapper(metrics):
+            for product in products:
+                Product.objects.get(pk=product.pk)
+            Product.objects.get(pk=products[0].pk)
+        self.assertEqual(metrics.queries, 6)
+        self.assertEqual(metrics.duplicates(), 1)
+        self.assertEqual(metrics.repeated(5)[0]["count"], 6)
+        self.assertEqual(metrics.repeated(7), [])
+
+    @override_settings(PERF_SAMPLE_RATE=1, PERF_SERVER_TIMING=True)
+    def test_sampled_request_is_logged(self):
+        Product.objects.create(name="Товар", price=100)
+        with self.assertLogs("config.performance", "INFO") as logs:
+            response = self.client.get(reverse("catalog:product_list"))
+        record = json.loads(logs.records[0].getMessage())
+        self.assertEqual(record["view"], "catalog:product_list")
+        self.assertEqual(record["status"], 200)
+        self.assertEqual(record["db_queries"], 2)
+        self.assertEqual(record["response_bytes"], len(response.content))
+        self.assertGreater(record["template_ms"], 0)
+        self.assertIn('db;dur=', response["Server-Timing"])
+
+    @override_settings(PERF_SAMPLE_RATE=1, PERF_SERVER_TIMING=True)
+    async def test_async_view_queries_are_counted(self):
+        await Product.objects.acreate(name="Товар", price=100, is_published=True)
+        view = AsyncProductListView.as_view()
+        middleware = PerformanceMiddleware(view)
+        request = AsyncViewsTestCase.make_request("/")
+        with self.assertLogs("config.performance", "INFO") as logs:
+            response = await middleware(request)
+        record = json.loads(logs.records[0].getMessage())
+        self.assertEqual(record["db_queries"], 2)
+        self.assertIn('desc="2 queries"', response["Server-Timing"])
+
+    @override_settings(PERF_SAMPLE_RATE=0)
+    def test_unsampled_request_is_not_logged(self):
+        with self.assertNoLogs("config.performance"):
+            response = self.client.get(reverse("catalog:product_list"))
+        self.assertNotIn("Server-Timing", response)
+
+
+class BenchmarkTestCase(TestCase):
+    """
+    Тесты набора замеров производительности
+    """
+
+    def test_routes_are_measured_on_seeded_data(self):
+        seed_benchmark_data(categories=2, products=10, versions=2, blogs=3, users=2)
+        self.assertEqual(Version.objects.filter(is_version_active=True).count(), 10)
+        user, routes = get_routes()
+        self.assertIsNotNone(user)
+        route = routes[0]
+        with override_settings(PERF_SAMPLE_RATE=1, PERF_SERVER_TIMING=True):
+            result = measure_client(route.method, route.url, None, iterations=3, warmup=1)
+        self.assertEqual(result["status"], [200])
+        self.assertEqual(result["queries"], 2)
+        self.assertIn("alloc_peak_kb", result)
+
+        routes = {route.name: route for route in routes}
+        self.assertIn("catalog:export:csv", routes)
+
+        def published():
+            return (
+                list(Blog.objects.order_by("pk").values_list("is_published", flat=True)),
+                list(Product.objects.order_by("pk").values_list("is_published", flat=True)),
+            )
+
+        for name in ("catalog:toggle_activity", "catalog:bulk_publish"):
+            route = routes[name]
+            before = published()
+            result = measure_client(
+                route.method,
+                route.url,
+                user if route.login else None,
+                iterations=3,
+                warmup=1,
+                allocations=False,
+                data=route.data,
+                reset=route.reset,
+            )
+            with self.subTest(name=name):
+                self.assertLess(max(result["status"]), 400)
+                # После каждого запроса данные возвращаются в исходное состояние
+                self.assertEqual(published(), before)
+        result = measure_client(
+            "GET", routes["catalog:export:jsonl"].url, user, iterations=2, warmup=0
+        )
+        self.assertEqual(result["status"], [200])
+
+    def test_listing_benchmark(self):
+        seed_benchmark_data(categories=2, products=10, versions=2, blogs=3, users=2)
+        out = StringIO()
+        call_command("benchmark_listing", rows=5, iterations=1, stdout=out)
+        self.assertIn("product_list  listing", out.getvalue())
+
+    def test_compare_fails_on_extra_queries(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        paths = []
+        for queries in (3, 4):
+            path = f"{directory}/{queries}.json"
+            with open(path, "w") as file:
+                json.dump(
+                    {
+                        "commit": None,
+                        "routes": {
+                            "catalog:product_list": {
+                                "client": {"p50_ms": 10, "queries": queries}
+                            }
+                        },
+                    },
+                    file,
+                )
+            paths.append(path)
+        call_command("compare_benchmarks", paths[0], paths[0], stdout=StringIO())
+        with self.assertRaises(CommandError):
+            call_command("compare_benchmarks", *paths, stdout=StringIO())
+
+
+class AsyncViewsTestCase(TestCase):
+    """
+    Тесты асинхронных вариантов страниц каталога и блога
+    """
+
+    @staticmethod
+    def make_request(path, **params):
+        request = AsyncRequestFactory().get(path, params)
+
+        async def auser():
+            return AnonymousUser()
+
+        request.auser = auser
+        return request
+
+    async def test_product_list(self):
+        category = await Category.objects.acreate(name="Категория")
+        for index in range(3):
+            product = await Product.objects.acreate(
+                name=f"Товар {index}", category=category, price=100, is_published=True
+            )
+            await Version.objects.acreate(
+                product=product, version_name="Активная", is_version_active=True
+            )
+        view = AsyncProductListView.as_view(paginate_by=2)
+        response = await view(self.make_request("/"))
+        self.assertContains(response, "Товар 0")
+        self.assertContains(response, "Товар 1")
+        self.assertNotContains(response, "Товар 2")
+        self.assertContains(response, "Активная", count=2)
+        self.assertContains(response, "Вперед")
+
+    async def test_product_detail(self):
+        product = await Product.objects.acreate(name="Товар", price=100)
+        view = AsyncProductDetailView.as_view()
+        response = await view(self.make_request("/"), pk=product.pk)
+        self.assertContains(response, "Название: Товар")
+        with self.assertRaises(Http404):
+            await view(self.make_request("/"), pk=product.pk + 1)
+
+    async def test_blog_detail_counts_views(self):
+        blog = await Blog.objects.acreate(title="Статья", views_count=5)
+        view = AsyncBlogDetailView.as_view()
+        response = await view(self.make_request("/"), pk=blog.pk)
+        self.assertContains(response, "Просмотры: 6")
+        await Blog.objects.filter(pk=blog.pk).aupdate(views_count=10)
+        updated = await view(self.make_request("/"), pk=blog.pk)
+        self.assertNotEqual(updated["ETag"], response["ETag"])
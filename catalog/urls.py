@@ -1,9 +1,14 @@
+from django.conf import settings
 from django.urls import path
-from django.views.decorators.cache import cache_page
 
 from catalog.apps import CatalogConfig
 from catalog.views import (
+    AsyncBlogDetailView,
+    AsyncBlogListView,
+    AsyncProductDetailView,
+    AsyncProductListView,
     ProductListView,
+    ProductSearchView,
     ProductDetailView,
     ContactCreateView,
     BlogListView,
@@ -12,30 +17,46 @@ from catalog.views import (
     BlogDetailView,
     BLogDeleteView,
     toggle_publish,
+    bulk_publish,
+    aexport_catalog,
+    export_catalog,
     ProductCreateView,
     ProductUpdateView,
 )
 
 app_name = CatalogConfig.name
 
+# Под ASGI-сервером страницы для чтения обслуживаются асинхронными вариантами
+if settings.ASYNC_VIEWS:
+    product_list_view = AsyncProductListView.as_view()
+    product_detail_view = AsyncProductDetailView.as_view()
+    blog_list_view = AsyncBlogListView.as_view()
+    blog_detail_view = AsyncBlogDetailView.as_view()
+    export_view = aexport_catalog
+else:
+    product_list_view = ProductListView.as_view()
+    product_detail_view = ProductDetailView.as_view()
+    blog_list_view = BlogListView.as_view()
+    blog_detail_view = BlogDetailView.as_view()
+    export_view = export_catalog
+
 urlpatterns = [
-    path("", ProductListView.as_view(), name="product_list"),
+    path("", product_list_view, name="product_list"),
+    path("search/", ProductSearchView.as_view(), name="product_search"),
     path("contacts/", ContactCreateView.as_view(), name="contacts"),
-    path(
-        "product/<int:pk>/",
-        cache_page(60)(ProductDetailView.as_view()),
-        name="product_detail",
-    ),
+    path("product/<int:pk>/", product_detail_view, name="product_detail"),
     path("product/create", ProductCreateView.as_view(), name="product_create"),
     path(
         "update_product/<int:pk>/", ProductUpdateView.as_view(), name="product_update"
     ),
-    path("blog/", BlogListView.as_view(), name="blog"),
+    path("blog/", blog_list_view, name="blog"),
     path("blog/create", BlogCreateView.as_view(), name="blog_create"),
-    path("detail_blog/<int:pk>/", BlogDetailView.as_view(), name="detail_blog"),
+    path("detail_blog/<int:pk>/", blog_detail_view, name="detail_blog"),
     path("update_blog/<int:pk>/", BlogUpdateView.as_view(), name="update_blog"),
     path("delete_blog/<int:pk>/", BLogDeleteView.as_view(), name="delete_blog"),
     path("activity/<int:pk>/", toggle_publish, name="toggle_activity"),
+    path("publish/<str:model_name>/", bulk_publish, name="bulk_publish"),
+    path("export/<str:export_format>/", export_view, name="export"),
 ]
 
 
@@ -1,7 +1,21 @@
+from asgiref.sync import sync_to_async
+from django.contrib.auth.decorators import login_required
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.core.exceptions import PermissionDenied
+from django.db import transaction
+from django.db.models import F
+from django.db.models.functions import Now
 from django.forms import inlineformset_factory
-from django.shortcuts import render, get_object_or_404, redirect
+from django.http import (
+    Http404,
+    HttpResponseBadRequest,
+    JsonResponse,
+    StreamingHttpResponse,
+)
+from django.shortcuts import render, redirect
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date
+from django.views.decorators.http import require_POST
 from django.urls import reverse_lazy, reverse
 from django.views.generic import (
     ListView,
@@ -12,22 +26,186 @@ from django.views.generic import (
 )
 from pytils.translit import slugify
 
-from catalog.forms import ProductForm, VersionForm, ProductModeratorForm
+from catalog.export import EXPORT_FORMATS, aexport_products, export_products
+from catalog.forms import (
+    ProductForm,
+    ProductModeratorForm,
+    VersionForm,
+    VersionFormSet,
+)
 from catalog.models import Product, Buyer, Blog, Version
-from catalog.services import get_categories_from_cache
+from catalog.pagination import KeysetPaginationMixin
+from catalog.permissions import can_moderate_product
+from catalog.services import (
+    aget_category_navigation,
+    aget_product_from_cache,
+    blog_views_counter,
+    get_product_from_cache,
+    set_published,
+)
+
+
+class ConditionalGetMixin:
+    """
+    Условный GET для страниц объекта: ETag и Last-Modified строятся по
+    updated_at, который читается отдельным легким запросом. Если клиент
+    прислал актуальные If-None-Match/If-Modified-Since, отвечаем 304
+    без загрузки объекта и отрисовки шаблона
+    """
+
+    # Дополнительная часть ETag для данных, которые меняются без updated_at
+    etag_suffix = ""
+
+    def get_last_modified(self):
+        return (
+            self.model.objects.filter(pk=self.kwargs["pk"])
+            .values_list("updated_at", flat=True)
+            .first()
+        )
+
+    def get_etag(self, last_modified):
+        # Меню страницы зависит от пользователя, поэтому он входит в ETag
+        return (
+            f'W/"{self.model._meta.model_name}-{self.kwargs["pk"]}-'
+            f'{last_modified.timestamp():.6f}{self.etag_suffix}-'
+            f'{self.request.user.pk or 0}"'
+        )
+
+    def not_modified(self):
+        """
+        Вызывается перед ответом 304
+        """
+
+    def check_conditions(self, last_modified):
+        """
+        Возвращает ответ 304, если у клиента актуальная версия страницы
+        """
+        if last_modified is None:
+            raise Http404(f"{self.model._meta.verbose_name} не найден(а)")
+        response = get_conditional_response(
+            self.request,
+            etag=self.get_etag(last_modified),
+            last_modified=int(last_modified.timestamp()),
+        )
+        if response is not None:
+            return self.set_validators(response, last_modified)
+        return None
+
+    def set_validators(self, response, last_modified):
+        response["ETag"] = self.get_etag(last_modified)
+        response["Last-Modified"] = http_date(last_modified.timestamp())
+        patch_vary_headers(response, ("Cookie",))
+        return response
+
+    def get(self, request, *args, **kwargs):
+        last_modified = self.get_last_modified()
+        response = self.check_conditions(last_modified)
+        if response is not None:
+            self.not_modified()
+            return response
+        return self.set_validators(super().get(request, *args, **kwargs), last_modified)
+
+
+class AsyncViewMixin:
+    """
+    Основа асинхронных вариантов представлений для чтения. Пользователь и
+    категории подвала загружаются через асинхронный API до отрисовки, поэтому
+    шаблон не обращается к БД и отрисовывается без перехода в поток
+    """
+
+    async def get_base_context(self):
+        self.request.user = await self.request.auser()
+        return {
+            "view": self,
+            "footer_categories": await aget_category_navigation(),
+        }
 
+    def render_page(self, context):
+        return render(self.request, self.get_template_names(), context)
 
-class ProductListView(ListView):
+
+class AsyncKeysetListMixin(AsyncViewMixin):
+    """
+    Асинхронный вывод списка с постраничным выводом по ключу
+    """
+
+    async def get(self, request, *args, **kwargs):
+        context = await self.get_base_context()
+        self.object_list = self.get_queryset()
+        paginator, page, object_list, is_paginated = await self.apaginate_queryset(
+            self.object_list, self.paginate_by
+        )
+        context.update(
+            paginator=paginator,
+            page_obj=page,
+            is_paginated=is_paginated,
+            object_list=object_list,
+            cursor_url_prefix=self.get_cursor_url_prefix(),
+        )
+        return self.render_page(context)
+
+
+class ProductListView(KeysetPaginationMixin, ListView):
     """Просмотр списка товаров"""
 
     model = Product
+    keyset = ("category_id", "name", "pk")
+    keyset_nullable = ("category_id",)
+
+    def get_queryset(self):
+        queryset = Product.objects.published().for_listing()
+        category = self.request.GET.get("category")
+        if category and category.isdigit():
+            queryset = queryset.filter(category_id=category)
+        return queryset
+
+
+class AsyncProductListView(AsyncKeysetListMixin, ProductListView):
+    """Асинхронный вариант ProductListView"""
 
+    async def get_base_context(self):
+        context = await super().get_base_context()
+        context["can_moderate_product"] = await sync_to_async(can_moderate_product)(
+            self.request.user
+        )
+        return context
+
+
+class ProductSearchView(ListView):
+    """Полнотекстовый поиск товаров"""
+
+    model = Product
+    paginate_by = 24
+    template_name = "catalog/product_search.html"
 
-class ProductDetailView(DetailView, LoginRequiredMixin):
+    def get_queryset(self):
+        self.query = self.request.GET.get("q", "").strip()
+        if not self.query:
+            return Product.objects.none()
+        return Product.objects.published().for_listing().search(self.query)
+
+    def get_context_data(self, **kwargs):
+        context_data = super().get_context_data(**kwargs)
+        context_data["query"] = self.query
+        return context_data
+
+
+class ProductDetailView(ConditionalGetMixin, DetailView, LoginRequiredMixin):
     """Просмотр информации о конкретном товаре"""
 
     model = Product
 
+    def get_last_modified(self):
+        # Товар из кэша сбрасывается при изменении, поэтому его updated_at
+        # актуален и проверка обходится без запроса к БД
+        self.product = get_product_from_cache(self.kwargs["pk"])
+        return self.product.updated_at if self.product is not None else None
+
+    def get_object(self, queryset=None):
+        if self.product is None:
+            raise Http404("Товар не найден")
+        return self.product
+
     def get_context_data(self, **kwargs):
         context_data = super().get_context_data(**kwargs)
         ProductFormset = inlineformset_factory(
@@ -48,6 +226,23 @@ class ProductDetailView(DetailView, LoginRequiredMixin):
         return super().form_valid(form)
 
 
+class AsyncProductDetailView(AsyncViewMixin, ProductDetailView):
+    """Асинхронный вариант ProductDetailView"""
+
+    async def get(self, request, *args, **kwargs):
+        request.user = await request.auser()
+        self.object = await aget_product_from_cache(kwargs["pk"])
+        if self.object is None:
+            raise Http404("Товар не найден")
+        last_modified = self.object.updated_at
+        response = self.check_conditions(last_modified)
+        if response is not None:
+            return response
+        context = await self.get_base_context()
+        context.update(object=self.object, product=self.object)
+        return self.set_validators(self.render_page(context), last_modified)
+
+
 class ProductCreateView(LoginRequiredMixin, CreateView):
     """
     Создание нового товара
@@ -59,7 +254,9 @@ class ProductCreateView(LoginRequiredMixin, CreateView):
 
     def get_context_data(self, **kwargs):
         context_data = super().get_context_data(**kwargs)
-        ProductFormset = inlineformset_factory(Product, Version, VersionForm, extra=1)
+        ProductFormset = inlineformset_factory(
+            Product, Version, VersionForm, formset=VersionFormSet, extra=1
+        )
         if self.request.method == "POST":
             context_data["formset"] = ProductFormset(
                 self.request.POST, instance=self.object
@@ -90,7 +287,9 @@ class ProductUpdateView(LoginRequiredMixin, UpdateView):
 
     def get_context_data(self, **kwargs):
         context_data = super().get_context_data(**kwargs)
-        ProductFormset = inlineformset_factory(Product, Version, VersionForm, extra=1)
+        ProductFormset = inlineformset_factory(
+            Product, Version, VersionForm, formset=VersionFormSet, extra=1
+        )
         if self.request.method == "POST":
             context_data["formset"] = ProductFormset(
                 self.request.POST, instance=self.object
@@ -100,13 +299,14 @@ class ProductUpdateView(LoginRequiredMixin, UpdateView):
         return context_data
 
     def form_valid(self, form):
-        context_data = self.get_context_data()
+        context_data = self.get_context_data(form=form)
         formset = context_data["formset"]
         if form.is_valid() and formset.is_valid():
-            self.object = form.save()
-            formset.instance = self.object
-            formset.save()
-            return super().form_valid(form)
+            with transaction.atomic():
+                self.object = form.save()
+                formset.instance = self.object
+                formset.save()
+            return redirect(self.get_success_url())
         else:
             return self.render_to_response(
                 self.get_context_data(form=form, formset=formset)
@@ -114,14 +314,9 @@ class ProductUpdateView(LoginRequiredMixin, UpdateView):
 
     def get_form_class(self):
         user = self.request.user
-        user.save()
-        if user == self.object.owner:
+        if user.pk == self.object.owner_id:
             return ProductForm
-        if (
-            user.has_perm("catalog.can_edit_product_description")
-            and user.has_perm("catalog.can_edit_product_category")
-            and user.has_perm("catalog.can_cancel_publication")
-        ):
+        if can_moderate_product(user):
             return ProductModeratorForm
         raise PermissionDenied
 
@@ -139,33 +334,79 @@ class ContactCreateView(CreateView):
     success_url = reverse_lazy("catalog:home")
 
 
-class BlogListView(ListView):
+class BlogListView(KeysetPaginationMixin, ListView):
     """
     Просмотр списка публикаций
     """
 
     model = Blog
+    keyset = ("title", "pk")
 
     def get_queryset(self, *args, **kwargs):
-        queryset = super().get_queryset(*args, **kwargs)
-        queryset = queryset.filter(is_published=True)
-        return queryset
+        return Blog.objects.published().for_listing()
 
 
-class BlogDetailView(DetailView):
+class BlogDetailView(ConditionalGetMixin, DetailView):
     """
     Просмотр конкретной публикации
     """
 
     model = Blog
 
+    def get_validators_queryset(self):
+        # Сброс счетчика просмотров не меняет updated_at, поэтому
+        # сохраненное в БД число просмотров читается тем же запросом
+        return Blog.objects.filter(pk=self.kwargs["pk"]).values_list(
+            "updated_at", "views_count"
+        )
+
+    def unpack_validators(self, validators):
+        if validators is None:
+            return None
+        last_modified, views_count = validators
+        self.etag_suffix = f"-{views_count}"
+        return last_modified
+
+    def get_last_modified(self):
+        return self.unpack_validators(self.get_validators_queryset().first())
+
+    def not_modified(self):
+        # Просмотр засчитывается и при ответе 304
+        blog_views_counter.incr(self.kwargs["pk"])
+
     def get_object(self, queryset=None):
         self.object = super().get_object(queryset)
-        self.object.views_count += 1
-        self.object.save()
+        self.object.views_count += blog_views_counter.incr(self.object.pk)
         return self.object
 
 
+class AsyncBlogListView(AsyncKeysetListMixin, BlogListView):
+    """
+    Асинхронный вариант BlogListView
+    """
+
+
+class AsyncBlogDetailView(AsyncViewMixin, BlogDetailView):
+    """
+    Асинхронный вариант BlogDetailView
+    """
+
+    async def get(self, request, *args, **kwargs):
+        request.user = await request.auser()
+        last_modified = self.unpack_validators(
+            await self.get_validators_queryset().afirst()
+        )
+        response = self.check_conditions(last_modified)
+        if response is not None:
+            await blog_views_counter.aincr(kwargs["pk"])
+            return response
+        context = await self.get_base_context()
+        self.object = await Blog.objects.aget(pk=kwargs["pk"])
+        self.object.views_count += await blog_views_counter.aincr(self.object.pk)
+        context.update(object=self.object, blog=self.object)
+        return self.set_validators(self.render_page(context), last_modified)
+
+
 class BlogCreateView(CreateView):
     """
     Создание новой публикации
@@ -226,13 +467,71 @@ def toggle_publish(request, pk):
     """
     Включение/отключение публикации
     """
-    publish_item = get_object_or_404(Blog, pk=pk)
-    if publish_item.is_published:
-        publish_item.is_published = False
-    else:
-        publish_item.is_published = True
-
-    publish_item.save()
+    # Один условный UPDATE: одновременные нажатия не затирают друг друга
+    updated = Blog.objects.filter(pk=pk).update(
+        is_published=~F("is_published"), updated_at=Now()
+    )
+    if not updated:
+        raise Http404("Публикация не найдена")
     return redirect(reverse("catalog:blog"))
 
 
+# Модели, доступные для массовой публикации, и право на нее
+BULK_PUBLISH_MODELS = {
+    "blog": (Blog, "catalog.change_blog"),
+    "product": (Product, "catalog.can_cancel_publication"),
+}
+
+
+@login_required
+@require_POST
+def bulk_publish(request, model_name):
+    """
+    Массовая публикация или снятие с публикации.
+    Принимает action=publish|unpublish и список pk
+    """
+    if model_name not in BULK_PUBLISH_MODELS:
+        raise Http404("Неизвестная модель")
+    model, permission = BULK_PUBLISH_MODELS[model_name]
+    if not request.user.has_perm(permission):
+        raise PermissionDenied
+    action = request.POST.get("action")
+    pks = request.POST.getlist("pk")
+    if action not in ("publish", "unpublish") or not all(pk.isdigit() for pk in pks):
+        return HttpResponseBadRequest("Ожидаются action=publish|unpublish и pk")
+    updated = set_published(model.objects.filter(pk__in=pks), action == "publish")
+    return JsonResponse({"updated": updated})
+
+
+def export_response(streaming_content, export_format):
+    response = StreamingHttpResponse(streaming_content, content_type="application/gzip")
+    response["Content-Disposition"] = (
+        f'attachment; filename="products.{export_format}.gz"'
+    )
+    return response
+
+
+@login_required
+def export_catalog(request, export_format):
+    """
+    Потоковая выгрузка опубликованных товаров в CSV или JSONL, сжатая gzip
+    """
+    if export_format not in EXPORT_FORMATS:
+        raise Http404("Неизвестный формат")
+    if not request.user.has_perm("catalog.view_product"):
+        raise PermissionDenied
+    return export_response(export_products(export_format), export_format)
+
+
+@login_required
+async def aexport_catalog(request, export_format):
+    """
+    Асинхронный вариант export_catalog: под ASGI синхронный итератор
+    был бы прочитан в память целиком перед отправкой
+    """
+    if export_format not in EXPORT_FORMATS:
+        raise Http404("Неизвестный формат")
+    user = await request.auser()
+    if not await user.ahas_perm("catalog.view_product"):
+        raise PermissionDenied
+    return export_response(aexport_products(export_format), export_format)
@@ -0,0 +1,163 @@
+import json
+import logging
+import random
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+
+from config.performance import (
+    RequestMetrics,
+    install_query_recorder,
+    request_metrics,
+)
+from config.routers import replica_state
+
+logger = logging.getLogger("config.performance")
+
+SAFE_METHODS = ("GET", "HEAD", "OPTIONS", "TRACE")
+
+
+class ContextMiddleware:
+    """
+    Основа middleware, которое готовит состояние до обработки запроса,
+    гарантированно освобождает его после и дополняет ответ. Работает
+    и в синхронной, и в асинхронной цепочке, чтобы асинхронные
+    представления не уходили в поток из-за middleware
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def enter(self, request):
+        return None
+
+    def exit(self, state):
+        pass
+
+    def process_response(self, request, response, state):
+        return response
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        state = self.enter(request)
+        try:
+            response = self.get_response(request)
+        finally:
+            self.exit(state)
+        return self.process_response(request, response, state)
+
+    async def __acall__(self, request):
+        state = self.enter(request)
+        try:
+            response = await self.get_response(request)
+        finally:
+            self.exit(state)
+        return self.process_response(request, response, state)
+
+
+class ReplicaStickinessMiddleware(ContextMiddleware):
+    """
+    Закрепляет запросы за основной БД после записи, чтобы пользователь
+    сразу видел свои изменения, пока реплики догоняют основную БД
+    """
+
+    cookie_name = "db_primary"
+
+    def enter(self, request):
+        state = {
+            "primary": request.method not in SAFE_METHODS
+            or self.cookie_name in request.COOKIES,
+            "wrote": False,
+        }
+        return state, replica_state.set(state)
+
+    def exit(self, state):
+        replica_state.reset(state[1])
+
+    def process_response(self, request, response, state):
+        if settings.DATABASE_REPLICAS and (
+            state[0]["wrote"] or request.method not in SAFE_METHODS
+        ):
+            response.set_cookie(
+                self.cookie_name,
+                "1",
+                max_age=settings.REPLICA_STICKY_SECONDS,
+                httponly=True,
+                samesite="Lax",
+            )
+        return response
+
+
+class PerformanceMiddleware(ContextMiddleware):
+    """
+    Замеряет время запроса, SQL-запросы, обращения к кэшу, отрисовку
+    шаблонов и размер ответа. Замеры выполняются только для доли запросов
+    PERF_SAMPLE_RATE, остальные проходят без накладных расходов.
+    Результат пишется строкой JSON в журнал config.performance и
+    в заголовок Server-Timing
+    """
+
+    def enter(self, request):
+        if random.random() >= settings.PERF_SAMPLE_RATE:
+            return None
+        # Соединения, открытые в этом потоке до подключения сигнала
+        # connection_created; новые получают обертку при открытии
+        for connection in connections.all(initialized_only=True):
+            install_query_recorder(connection)
+        metrics = RequestMetrics()
+        return metrics, request_metrics.set(metrics)
+
+    def exit(self, state):
+        if state is not None:
+            request_metrics.reset(state[1])
+
+    def process_response(self, request, response, state):
+        if state is None:
+            return response
+        metrics = state[0]
+        duration = time.perf_counter() - metrics.started
+
+        if settings.PERF_SERVER_TIMING:
+            response["Server-Timing"] = (
+                f'db;dur={metrics.db_time * 1000:.1f};desc="{metrics.queries} queries", '
+                f"tpl;dur={metrics.template_time * 1000:.1f}, "
+                f'cache;desc="hits={metrics.cache_hits} misses={metrics.cache_misses}", '
+                f"total;dur={duration * 1000:.1f}"
+            )
+
+        match = request.resolver_match
+        repeated = metrics.repeated(settings.PERF_N_PLUS_ONE_THRESHOLD)
+        duplicates = metrics.duplicates()
+        logger.log(
+            logging.WARNING if repeated or duplicates else logging.INFO,
+            json.dumps(
+                {
+                    "time": time.time(),
+                    "method": request.method,
+                    "path": request.path,
+                    "view": match.view_name if match else None,
+                    "status": response.status_code,
+                    "duration_ms": round(duration * 1000, 2),
+                    "db_queries": metrics.queries,
+                    "db_time_ms": round(metrics.db_time * 1000, 2),
+                    "db_duplicates": duplicates,
+                    "db_repeated": repeated,
+                    "cache_hits": metrics.cache_hits,
+                    "cache_misses": metrics.cache_misses,
+                    "template_ms": round(metrics.template_time * 1000, 2),
+                    "response_bytes": (
+                        None if response.streaming else len(response.content)
+                    ),
+                },
+                ensure_ascii=False,
+            ),
+        )
+        return response
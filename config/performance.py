@@ -0,0 +1,135 @@
+import time
+from collections import Counter
+from contextvars import ContextVar
+
+from django.core.cache.backends.redis import RedisCache
+from django.db.backends.signals import connection_created
+from django.template.backends.django import DjangoTemplates
+from django.template.backends.django import Template as DjangoTemplate
+
+# Метрики текущего запроса; None, если запрос не попал в выборку
+request_metrics = ContextVar("request_metrics", default=None)
+
+_missing = object()
+
+
+class RequestMetrics:
+    """
+    Счетчики одного запроса: SQL, кэш и отрисовка шаблонов
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_time = 0.0
+        self.statements = Counter()
+        self.executions = Counter()
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.template_time = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        # Обертка для connection.execute_wrapper
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += time.perf_counter() - started
+            self.queries += 1
+            self.statements[sql] += 1
+            self.executions[(sql, repr(params))] += 1
+
+    def duplicates(self):
+        """
+        Количество запросов, повторяющих уже выполненный с теми же параметрами
+        """
+        return sum(count - 1 for count in self.executions.values() if count > 1)
+
+    def repeated(self, threshold):
+        """
+        Запросы, выполненные не меньше threshold раз с разными параметрами:
+        типичный признак N+1
+        """
+        return [
+            {"sql": sql[:300], "count": count}
+            for sql, count in self.statements.most_common()
+            if count >= threshold
+        ]
+
+
+def record_query(execute, sql, params, many, context):
+    """
+    Постоянная обертка соединений: передает запрос метрикам текущего
+    запроса, если он попал в выборку. ContextVar переходит и в потоки
+    sync_to_async, где асинхронный ORM выполняет запросы, поэтому
+    запросы асинхронных представлений тоже учитываются
+    """
+    metrics = request_metrics.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    return metrics(execute, sql, params, many, context)
+
+
+def install_query_recorder(connection, **kwargs):
+    # Соединения потоко-зависимы: обертка ставится на каждое соединение
+    # в том потоке, где оно открывается
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+connection_created.connect(
+    lambda sender, connection, **kwargs: install_query_recorder(connection),
+    weak=False,
+    dispatch_uid="config_performance_query_recorder",
+)
+
+
+class InstrumentedRedisCache(RedisCache):
+    """
+    Redis-кэш, который считает попадания и промахи для метрик запроса
+    """
+
+    def get(self, key, default=None, version=None):
+        value = super().get(key, _missing, version)
+        metrics = request_metrics.get()
+        if metrics is not None:
+            if value is _missing:
+                metrics.cache_misses += 1
+            else:
+                metrics.cache_hits += 1
+        return default if value is _missing else value
+
+    def get_many(self, keys, version=None):
+        keys = list(keys)
+        values = super().get_many(keys, version)
+        metrics = request_metrics.get()
+        if metrics is not None:
+            metrics.cache_hits += len(values)
+            metrics.cache_misses += len(keys) - len(values)
+        return values
+
+
+class InstrumentedTemplate(DjangoTemplate):
+    def render(self, context=None, request=None):
+        metrics = request_metrics.get()
+        if metrics is None:
+            return super().render(context, request)
+        started = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            metrics.template_time += time.perf_counter() - started
+
+
+class InstrumentedDjangoTemplates(DjangoTemplates):
+    """
+    Шаблонизатор Django, который замеряет время отрисовки шаблонов
+    верхнего уровня (вложенные include входят в это время)
+    """
+
+    def from_string(self, template_code):
+        return InstrumentedTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        template = super().get_template(template_name)
+        return InstrumentedTemplate(template.template, self)
@@ -0,0 +1,52 @@
+import random
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import connections
+
+# Состояние текущего запроса: читать ли с основной БД и была ли запись
+replica_state = ContextVar("replica_state", default=None)
+
+
+class ReplicaRouter:
+    """
+    Направляет чтение моделей каталога на реплики из DATABASE_REPLICAS.
+    Реплика выбирается только для запросов, которые ReplicaStickinessMiddleware
+    разрешила читать с нее. Запись, команды, миграции, чтение внутри
+    транзакции на default и запросы, закрепленные за основной БД, идут
+    в default, чтобы видеть только что записанные данные
+    """
+
+    route_app_labels = {"catalog"}
+
+    def db_for_read(self, model, **hints):
+        if model._meta.app_label not in self.route_app_labels:
+            return None
+        state = replica_state.get()
+        if (
+            not settings.DATABASE_REPLICAS
+            or state is None
+            or state["primary"]
+            or connections["default"].in_atomic_block
+        ):
+            return "default"
+        return random.choice(settings.DATABASE_REPLICAS)
+
+    def db_for_write(self, model, **hints):
+        state = replica_state.get()
+        if state is not None:
+            state["wrote"] = True
+        if model._meta.app_label in self.route_app_labels:
+            return "default"
+        return None
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {"default", *settings.DATABASE_REPLICAS}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db in settings.DATABASE_REPLICAS:
+            return False
+        return None
@@ -20,16 +20,19 @@ INSTALLED_APPS = [
     "django.contrib.sessions",
     "django.contrib.messages",
     "django.contrib.staticfiles",
+    "django.contrib.postgres",
     "catalog",
     "users",
 ]
 
 MIDDLEWARE = [
+    "config.middleware.PerformanceMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
+    "config.middleware.ReplicaStickinessMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
 ]
@@ -38,7 +41,7 @@ ROOT_URLCONF = "config.urls"
 
 TEMPLATES = [
     {
-        "BACKEND": "django.template.backends.django.DjangoTemplates",
+        "BACKEND": "config.performance.InstrumentedDjangoTemplates",
         "DIRS": [],
         "APP_DIRS": True,
         "OPTIONS": {
@@ -47,6 +50,9 @@ TEMPLATES = [
                 "django.template.context_processors.request",
                 "django.contrib.auth.context_processors.auth",
                 "django.contrib.messages.context_processors.messages",
+                "catalog.context_processors.categories",
+                "catalog.context_processors.fragment_cache",
+                "catalog.context_processors.permissions",
             ],
         },
     },
@@ -56,13 +62,48 @@ WSGI_APPLICATION = "config.wsgi.application"
 
 DATABASES = {
     "default": {
-        "ENGINE": "django.db.backends.postgresql_psycopg2",
+        "ENGINE": "django.db.backends.postgresql",
         "NAME": os.getenv("NAME"),
         "USER": os.getenv("DB_USER"),
         "PASSWORD": os.getenv("PASSWORD"),
+        "HOST": os.getenv("DB_HOST", ""),
+        "PORT": os.getenv("DB_PORT", ""),
+        # Соединение переиспользуется между запросами, пока не истечет срок, секунды
+        "CONN_MAX_AGE": int(os.getenv("DB_CONN_MAX_AGE", 60)),
+        # Перед переиспользованием соединение проверяется, разорванное открывается заново
+        "CONN_HEALTH_CHECKS": os.getenv("DB_CONN_HEALTH_CHECKS", "True") == "True",
+        "OPTIONS": {},
     }
 }
 
+# Пул соединений psycopg 3 (пакет psycopg[pool] из requirements.txt).
+# Пул заменяет постоянные соединения, поэтому CONN_MAX_AGE сбрасывается в 0
+DB_POOL = os.getenv("DB_POOL", False) == "True"
+if DB_POOL:
+    DATABASES["default"]["CONN_MAX_AGE"] = 0
+    DATABASES["default"]["OPTIONS"]["pool"] = {
+        "min_size": int(os.getenv("DB_POOL_MIN_SIZE", 2)),
+        "max_size": int(os.getenv("DB_POOL_MAX_SIZE", 10)),
+        "timeout": int(os.getenv("DB_POOL_TIMEOUT", 10)),
+    }
+
+# Реплики для чтения каталога: хосты через запятую. В тестах они
+# зеркалируют default
+DATABASE_REPLICAS = []
+for index, host in enumerate(filter(None, os.getenv("DB_REPLICA_HOSTS", "").split(",")), 1):
+    alias = f"replica_{index}"
+    DATABASES[alias] = {
+        **DATABASES["default"],
+        "HOST": host.strip(),
+        "OPTIONS": dict(DATABASES["default"]["OPTIONS"]),
+        "TEST": {"MIRROR": "default"},
+    }
+    DATABASE_REPLICAS.append(alias)
+
+DATABASE_ROUTERS = ["config.routers.ReplicaRouter"]
+# Сколько секунд после записи пользователь читает с основной БД
+REPLICA_STICKY_SECONDS = int(os.getenv("REPLICA_STICKY_SECONDS", 10))
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         "NAME": "django.contrib.auth.password_validation.UserAttributeSimilarityValidator",
@@ -109,14 +150,69 @@ EMAIL_USE_SSL = os.getenv("EMAIL_USE_SSL", False) == "True"
 SERVER_EMAIL = EMAIL_HOST_USER
 DEFAULT_FROM_EMAIL = EMAIL_HOST_USER
 
+# Срок действия ссылки подтверждения почты, часы
+EMAIL_VERIFICATION_TTL = int(os.getenv("EMAIL_VERIFICATION_TTL", 48))
+
+# Очередь исходящих писем (команда send_outbox)
+EMAIL_OUTBOX_BATCH_SIZE = int(os.getenv("EMAIL_OUTBOX_BATCH_SIZE", 100))
+EMAIL_OUTBOX_WORKERS = int(os.getenv("EMAIL_OUTBOX_WORKERS", 4))
+EMAIL_OUTBOX_MAX_ATTEMPTS = int(os.getenv("EMAIL_OUTBOX_MAX_ATTEMPTS", 5))
+# Задержка перед первой повторной попыткой, дальше она удваивается, секунды
+EMAIL_OUTBOX_RETRY_DELAY = int(os.getenv("EMAIL_OUTBOX_RETRY_DELAY", 60))
+# На это время взятые в отправку письма скрыты от других обработчиков, секунды
+EMAIL_OUTBOX_LEASE = int(os.getenv("EMAIL_OUTBOX_LEASE", 300))
+
 
 CACHE_ENABLED = os.getenv("CACHE_ENABLED", False) == "True"
 if CACHE_ENABLED:
     CACHES = {
         "default": {
-            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "BACKEND": "config.performance.InstrumentedRedisCache",
             "LOCATION": os.getenv("LOCATION"),
         }
     }
 
+# Файл со списком запрещенных слов, по слову на строку
+FORBIDDEN_WORDS_FILE = os.getenv("FORBIDDEN_WORDS_FILE")
+
+# Время жизни кэшированных товаров и фрагментов шаблонов, секунды
+FRAGMENT_CACHE_TIMEOUT = int(os.getenv("FRAGMENT_CACHE_TIMEOUT", 600))
+
+# Время жизни записей в кэше процесса перед общим кэшем, секунды
+LOCAL_CACHE_TTL = int(os.getenv("LOCAL_CACHE_TTL", 5))
 
+BLOG_VIEWS_FLUSH_INTERVAL = int(os.getenv("BLOG_VIEWS_FLUSH_INTERVAL", 30))
+
+# Асинхронные варианты страниц каталога и блога для запуска под ASGI-сервером
+ASYNC_VIEWS = os.getenv("ASYNC_VIEWS", False) == "True"
+
+# Замеры производительности запросов (config.middleware.PerformanceMiddleware)
+# Доля запросов, для которых выполняются замеры, от 0 до 1
+PERF_SAMPLE_RATE = float(os.getenv("PERF_SAMPLE_RATE", 0.05))
+PERF_SERVER_TIMING = os.getenv("PERF_SERVER_TIMING", "True") == "True"
+# Столько одинаковых SQL-запросов за запрос считаются признаком N+1
+PERF_N_PLUS_ONE_THRESHOLD = int(os.getenv("PERF_N_PLUS_ONE_THRESHOLD", 5))
+PERF_LOG_FILE = os.getenv("PERF_LOG_FILE", BASE_DIR / "perf.jsonl")
+
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "formatters": {
+        "message": {"format": "%(message)s"},
+    },
+    "handlers": {
+        "performance": {
+            "class": "logging.FileHandler",
+            "filename": PERF_LOG_FILE,
+            "formatter": "message",
+            "delay": True,
+        },
+    },
+    "loggers": {
+        "config.performance": {
+            "handlers": ["performance"],
+            "level": "INFO",
+            "propagate": False,
+        },
+    },
+}
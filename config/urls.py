@@ -1,12 +1,28 @@
 from django.conf import settings
 from django.conf.urls.static import static
 from django.contrib import admin
-from django.urls import path, include
+from django.urls import path, include, re_path
+from django.views.decorators.cache import cache_control
+from django.views.static import serve
+
+from catalog.storage import BLOB_DIR
 
 urlpatterns = [
     path("admin/", admin.site.urls),
     path("", include("catalog.urls", namespace="catalog")),
     path("users/", include("users.urls", namespace="users"))
 
-] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+]
+
+if settings.DEBUG:
+    # Имена файлов в хранилище зависят только от содержимого, поэтому
+    # их можно кэшировать бессрочно
+    urlpatterns += [
+        re_path(
+            rf"^{settings.MEDIA_URL.strip('/')}/(?P<path>{BLOB_DIR}/.*)$",
+            cache_control(public=True, max_age=31536000, immutable=True)(serve),
+            {"document_root": settings.MEDIA_ROOT},
+        ),
+    ]
 
+urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
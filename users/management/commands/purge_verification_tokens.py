@@ -0,0 +1,11 @@
+from django.core.management import BaseCommand
+
+from users.models import EmailVerificationToken
+
+
+class Command(BaseCommand):
+    help = "Удаляет просроченные токены подтверждения почты"
+
+    def handle(self, *args, **options):
+        deleted = EmailVerificationToken.objects.purge_expired()
+        self.stdout.write(f"Удалено токенов: {deleted}")
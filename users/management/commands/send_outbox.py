@@ -0,0 +1,35 @@
+import time
+
+from django.core.management import BaseCommand
+
+from users.services import deliver_outbox
+
+
+class Command(BaseCommand):
+    help = "Отправляет письма из очереди исходящих писем"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, help="Писем в одной пачке")
+        parser.add_argument("--workers", type=int, help="Количество потоков отправки")
+        parser.add_argument("--max-attempts", type=int, help="Максимум попыток на письмо")
+        parser.add_argument(
+            "--loop", action="store_true", help="Работать постоянно, опрашивая очередь"
+        )
+        parser.add_argument(
+            "--interval", type=float, default=5, help="Пауза между опросами, секунды"
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            sent, failed = deliver_outbox(
+                batch_size=options["batch_size"],
+                workers=options["workers"],
+                max_attempts=options["max_attempts"],
+            )
+            if sent or failed:
+                self.stdout.write(f"Отправлено: {sent}, с ошибкой: {failed}")
+                continue
+            # Очередь пуста: без --loop завершаем работу, иначе ждем новых писем
+            if not options["loop"]:
+                break
+            time.sleep(options["interval"])
@@ -0,0 +1,26 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:41
+
+import catalog.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("users", "0002_user_token"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="user",
+            name="avatar",
+            field=models.ImageField(
+                blank=True,
+                help_text="Загрузите аватар",
+                null=True,
+                storage=catalog.storage.get_media_storage,
+                upload_to="users/avatars/",
+                verbose_name="Аватар",
+            ),
+        ),
+    ]
@@ -0,0 +1,77 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:45
+
+import hashlib
+from datetime import timedelta
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def copy_pending_tokens(apps, schema_editor):
+    # Ссылки, уже отправленные неактивным пользователям, продолжают работать
+    User = apps.get_model("users", "User")
+    EmailVerificationToken = apps.get_model("users", "EmailVerificationToken")
+    expires_at = timezone.now() + timedelta(hours=settings.EMAIL_VERIFICATION_TTL)
+    pending = User.objects.filter(is_active=False, token__isnull=False).exclude(token="")
+    EmailVerificationToken.objects.bulk_create(
+        EmailVerificationToken(
+            user_id=user_id,
+            token_hash=hashlib.sha256(token.encode()).hexdigest(),
+            expires_at=expires_at,
+        )
+        for user_id, token in pending.values_list("id", "token").iterator()
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("users", "0004_outgoing_email"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="EmailVerificationToken",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "token_hash",
+                    models.CharField(
+                        max_length=64, unique=True, verbose_name="Хеш токена"
+                    ),
+                ),
+                (
+                    "expires_at",
+                    models.DateTimeField(db_index=True, verbose_name="Действует до"),
+                ),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="verification_tokens",
+                        to=settings.AUTH_USER_MODEL,
+                        verbose_name="Пользователь",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Токен подтверждения почты",
+                "verbose_name_plural": "Токены подтверждения почты",
+            },
+        ),
+        migrations.RunPython(copy_pending_tokens, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name="user",
+            name="token",
+        ),
+    ]
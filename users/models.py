@@ -1,16 +1,23 @@
+import hashlib
+import secrets
+from datetime import timedelta
+
+from django.conf import settings
 from django.contrib.auth.models import AbstractUser
-from django.db import models
+from django.db import models, transaction
+from django.utils import timezone
+
+from catalog.storage import get_media_storage
 
 
 class User(AbstractUser):
     username = None
     email = models.EmailField(unique=True, verbose_name="Email", help_text="Введите e-mail")
 
-    avatar = models.ImageField(upload_to="users/avatars/", verbose_name="Аватар", blank=True, null=True, help_text="Загрузите аватар")
+    avatar = models.ImageField(upload_to="users/avatars/", storage=get_media_storage, verbose_name="Аватар", blank=True, null=True, help_text="Загрузите аватар")
     phone = models.CharField(max_length=35, verbose_name="Телефон", blank=True, null=True, help_text="Введите номер телефона")
     country = models.CharField(max_length=100, verbose_name="Страна", blank=True, null=True, help_text="Введите страну")
 
-    token = models.CharField(max_length=100, verbose_name="Token", blank=True, null=True)
     USERNAME_FIELD = "email"
     REQUIRED_FIELDS = []
 
@@ -20,3 +27,106 @@ class User(AbstractUser):
 
     def __str__(self):
         return self.email
+
+
+def hash_token(token):
+    """
+    Хеш токена подтверждения. В БД хранится только он
+    """
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+class EmailVerificationTokenManager(models.Manager):
+    def issue(self, user):
+        """
+        Создает токен подтверждения почты и возвращает его открытое значение
+        """
+        token = secrets.token_urlsafe(32)
+        self.create(
+            user=user,
+            token_hash=hash_token(token),
+            expires_at=timezone.now() + timedelta(hours=settings.EMAIL_VERIFICATION_TTL),
+        )
+        return token
+
+    def redeem(self, token):
+        """
+        Погашает токен и возвращает его пользователя.
+        Каждый токен можно использовать один раз
+        """
+        with transaction.atomic():
+            verification = (
+                self.select_for_update()
+                .select_related("user")
+                .filter(token_hash=hash_token(token), expires_at__gt=timezone.now())
+                .first()
+            )
+            if verification is None:
+                return None
+            verification.delete()
+        return verification.user
+
+    def purge_expired(self):
+        """
+        Удаляет просроченные токены
+        """
+        deleted, _ = self.filter(expires_at__lte=timezone.now()).delete()
+        return deleted
+
+
+class EmailVerificationToken(models.Model):
+    """
+    Токен подтверждения почты
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="verification_tokens", verbose_name="Пользователь")
+    token_hash = models.CharField(max_length=64, unique=True, verbose_name="Хеш токена")
+    expires_at = models.DateTimeField(db_index=True, verbose_name="Действует до")
+
+    objects = EmailVerificationTokenManager()
+
+    class Meta:
+        verbose_name = "Токен подтверждения почты"
+        verbose_name_plural = "Токены подтверждения почты"
+
+    def __str__(self):
+        return f"{self.user} до {self.expires_at}"
+
+
+class OutgoingEmail(models.Model):
+    """
+    Письмо в очереди на отправку. Записывается в той же транзакции,
+    что и изменения пользователя, и отправляется командой send_outbox
+    """
+    STATUS_PENDING = "pending"
+    STATUS_SENT = "sent"
+    STATUS_FAILED = "failed"
+    STATUS_CHOICES = (
+        (STATUS_PENDING, "Ожидает отправки"),
+        (STATUS_SENT, "Отправлено"),
+        (STATUS_FAILED, "Не отправлено"),
+    )
+
+    subject = models.CharField(max_length=255, verbose_name="Тема")
+    message = models.TextField(verbose_name="Текст письма")
+    from_email = models.CharField(max_length=254, verbose_name="Отправитель", blank=True, null=True)
+    recipients = models.JSONField(verbose_name="Получатели")
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=STATUS_PENDING, verbose_name="Статус")
+    attempts = models.PositiveSmallIntegerField(default=0, verbose_name="Попыток отправки")
+    next_attempt_at = models.DateTimeField(default=timezone.now, verbose_name="Следующая попытка")
+    last_error = models.TextField(blank=True, verbose_name="Последняя ошибка")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Дата создания")
+    sent_at = models.DateTimeField(blank=True, null=True, verbose_name="Дата отправки")
+
+    class Meta:
+        verbose_name = "Исходящее письмо"
+        verbose_name_plural = "Исходящие письма"
+        indexes = [
+            models.Index(
+                fields=["next_attempt_at"],
+                condition=models.Q(status="pending"),
+                name="outbox_pending_idx",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.subject} ({', '.join(self.recipients)})"
@@ -0,0 +1,115 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.utils import timezone
+
+from users.models import OutgoingEmail
+
+
+def enqueue_email(subject, message, recipient_list, from_email=None):
+    """
+    Ставит письмо в очередь. Вызывается внутри транзакции запроса,
+    поэтому письмо уходит только если изменения в БД зафиксированы
+    """
+    return OutgoingEmail.objects.create(
+        subject=subject,
+        message=message,
+        from_email=from_email or settings.DEFAULT_FROM_EMAIL,
+        recipients=list(recipient_list),
+    )
+
+
+def claim_emails(batch_size):
+    """
+    Забирает пачку писем на отправку. Строки, заблокированные другим
+    обработчиком, пропускаются, а взятые письма откладываются на время
+    отправки, чтобы их не взял никто другой
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        emails = list(
+            OutgoingEmail.objects.select_for_update(skip_locked=True)
+            .filter(status=OutgoingEmail.STATUS_PENDING, next_attempt_at__lte=now)
+            .order_by("next_attempt_at")[:batch_size]
+        )
+        OutgoingEmail.objects.filter(pk__in=[email.pk for email in emails]).update(
+            next_attempt_at=now + timedelta(seconds=settings.EMAIL_OUTBOX_LEASE)
+        )
+    return emails
+
+
+def send_chunk(emails):
+    """
+    Отправляет письма через одно SMTP-соединение.
+    Возвращает пары (письмо, текст ошибки или None)
+    """
+    results = []
+    connection = get_connection()
+    try:
+        connection.open()
+        for email in emails:
+            try:
+                EmailMessage(
+                    subject=email.subject,
+                    body=email.message,
+                    from_email=email.from_email,
+                    to=email.recipients,
+                    connection=connection,
+                ).send()
+            except Exception as error:
+                results.append((email, repr(error)))
+            else:
+                results.append((email, None))
+    except Exception as error:
+        done = {email.pk for email, _ in results}
+        results.extend((email, repr(error)) for email in emails if email.pk not in done)
+    finally:
+        connection.close()
+    return results
+
+
+def save_results(results, max_attempts):
+    now = timezone.now()
+    sent = [email.pk for email, error in results if error is None]
+    # Текст отправленных писем содержит пароли и ссылки подтверждения,
+    # поэтому в БД он не хранится
+    OutgoingEmail.objects.filter(pk__in=sent).update(
+        status=OutgoingEmail.STATUS_SENT, sent_at=now, message="", last_error=""
+    )
+    for email, error in results:
+        if error is None:
+            continue
+        attempts = email.attempts + 1
+        if attempts >= max_attempts:
+            changes = {"status": OutgoingEmail.STATUS_FAILED}
+        else:
+            # Экспоненциальная задержка между попытками
+            delay = settings.EMAIL_OUTBOX_RETRY_DELAY * 2 ** (attempts - 1)
+            changes = {"next_attempt_at": now + timedelta(seconds=delay)}
+        OutgoingEmail.objects.filter(pk=email.pk).update(
+            attempts=attempts, last_error=error, **changes
+        )
+    return len(sent), len(results) - len(sent)
+
+
+def deliver_outbox(batch_size=None, workers=None, max_attempts=None):
+    """
+    Отправляет одну пачку писем из очереди в несколько потоков.
+    Возвращает количество отправленных и неотправленных писем
+    """
+    batch_size = batch_size or settings.EMAIL_OUTBOX_BATCH_SIZE
+    workers = workers or settings.EMAIL_OUTBOX_WORKERS
+    max_attempts = max_attempts or settings.EMAIL_OUTBOX_MAX_ATTEMPTS
+
+    emails = claim_emails(batch_size)
+    if not emails:
+        return 0, 0
+    chunks = [emails[index::workers] for index in range(workers)]
+    results = []
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for chunk_results in executor.map(send_chunk, [c for c in chunks if c]):
+            results.extend(chunk_results)
+    return save_results(results, max_attempts)
@@ -1,3 +1,87 @@
-from django.test import TestCase
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.core import mail
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from users.models import EmailVerificationToken, OutgoingEmail, User
+
+
+class OutboxTestCase(TestCase):
+    """
+    Тесты очереди исходящих писем
+    """
+
+    def register(self):
+        return self.client.post(
+            reverse("users:register"),
+            {
+                "email": "new@example.com",
+                "password1": "Sk1-store-pass",
+                "password2": "Sk1-store-pass",
+            },
+        )
+
+    def test_registration_enqueues_email(self):
+        response = self.register()
+        self.assertRedirects(response, reverse("users:login"))
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertEqual(OutgoingEmail.objects.get().recipients, ["new@example.com"])
+
+        call_command("send_outbox", stdout=StringIO())
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, ["new@example.com"])
+        email = OutgoingEmail.objects.get()
+        self.assertEqual(email.status, OutgoingEmail.STATUS_SENT)
+        self.assertEqual(email.message, "")
+
+    @override_settings(EMAIL_OUTBOX_MAX_ATTEMPTS=2)
+    def test_failed_email_is_retried_with_backoff(self):
+        self.register()
+        with mock.patch(
+            "django.core.mail.backends.locmem.EmailBackend.send_messages",
+            side_effect=OSError("SMTP недоступен"),
+        ):
+            call_command("send_outbox", stdout=StringIO())
+            email = OutgoingEmail.objects.get()
+            self.assertEqual(email.status, OutgoingEmail.STATUS_PENDING)
+            self.assertEqual(email.attempts, 1)
+            self.assertGreater(email.next_attempt_at, timezone.now())
+
+            OutgoingEmail.objects.update(next_attempt_at=timezone.now())
+            call_command("send_outbox", stdout=StringIO())
+            email.refresh_from_db()
+            self.assertEqual(email.status, OutgoingEmail.STATUS_FAILED)
+            self.assertIn("SMTP", email.last_error)
+        self.assertTrue(User.objects.filter(email="new@example.com").exists())
+
+
+class EmailVerificationTestCase(TestCase):
+    """
+    Тесты подтверждения почты
+    """
+
+    def setUp(self):
+        self.user = User.objects.create(email="new@example.com", is_active=False)
+
+    def test_token_is_single_use(self):
+        token = EmailVerificationToken.objects.issue(self.user)
+        self.assertNotEqual(EmailVerificationToken.objects.get().token_hash, token)
+
+        url = reverse("users:email-confirm", args=[token])
+        self.assertRedirects(self.client.get(url), reverse("users:login"))
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.is_active)
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+    def test_expired_token_is_rejected_and_purged(self):
+        token = EmailVerificationToken.objects.issue(self.user)
+        EmailVerificationToken.objects.update(expires_at=timezone.now())
+        url = reverse("users:email-confirm", args=[token])
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+        call_command("purge_verification_tokens", stdout=StringIO())
+        self.assertFalse(EmailVerificationToken.objects.exists())
@@ -1,12 +1,14 @@
 from django.contrib.auth.forms import PasswordResetForm
 from django.contrib.auth.views import PasswordResetView
-from django.core.mail import send_mail
-from django.shortcuts import get_object_or_404, redirect
+from django.db import transaction
+from django.http import Http404
+from django.shortcuts import redirect
 from django.urls import reverse_lazy, reverse
 from django.views.generic import CreateView
 
 from users.forms import UserRegisterForm
-from users.models import User
+from users.models import EmailVerificationToken, User
+from users.services import enqueue_email
 import secrets
 from config.settings import EMAIL_HOST_USER
 
@@ -18,15 +20,15 @@ class UserCreateView(CreateView):
     form_class = UserRegisterForm
     success_url = reverse_lazy('users:login')
 
+    @transaction.atomic
     def form_valid(self, form):
-        user = form.save()
+        user = form.save(commit=False)
         user.is_active = False
-        token = secrets.token_hex(16)
-        user.token = token
         user.save()
+        token = EmailVerificationToken.objects.issue(user)
         host = self.request.get_host()
         url = f'http://{host}/users/email-confirm/{token}/'
-        send_mail(
+        enqueue_email(
             subject="Подтверждение почты",
             message=f"Привет! Перейди по ссылке для подтверждения почты {url}",
             from_email=EMAIL_HOST_USER,
@@ -35,9 +37,11 @@ class UserCreateView(CreateView):
         return super().form_valid(form)
 
 def email_verification(request, token):
-    user = get_object_or_404(User, token=token)
+    user = EmailVerificationToken.objects.redeem(token)
+    if user is None:
+        raise Http404("Ссылка недействительна или устарела")
     user.is_active = True
-    user.save()
+    user.save(update_fields=["is_active"])
     return redirect(reverse("users:login"))
 
 
@@ -46,12 +50,13 @@ class NewPasswordView(PasswordResetView):
     template_name = "users/new_password.html"
     success_url = reverse_lazy("users:login")
 
+    @transaction.atomic
     def form_valid(self, form):
         email = form.cleaned_data["email"]
         user = User.objects.get(email=email)
         if user:
             password = secrets.token_urlsafe(10)
-            send_mail(
+            enqueue_email(
                 subject="Новый пароль",
                 message=f"Здравствуй! Новый пароль для входа в твой аккаунт: {password}",
                 from_email=EMAIL_HOST_USER,